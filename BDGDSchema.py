@@ -0,0 +1,55 @@
+# Esquema declarado das tabelas da BDGD.
+# Usado pelo Converter para gravar colunas tipadas e pelo DSSWriter para ler os
+# arquivos já com os tipos certos (sem reconverter texto em número a cada linha).
+#
+# 'float'    -> números reais (float64)
+# 'category' -> códigos com poucos valores distintos (dicionário/categoria)
+# 'id'       -> identificadores (PAC, COD_ID, UNI_TR_MT...) codificados como dicionário
+#
+# Colunas não listadas mantêm o tipo da camada de origem.
+
+# Colunas das curvas de carga (potência a cada 15 minutos)
+POT_COLUMNS = [f"POT_{i:02d}" for i in range(1, 97)]
+
+BDGD_SCHEMA = {
+    'UCBT_tab': {
+        'float': ['CAR_INST'],
+        'category': ['FAS_CON', 'TIP_CC', 'TEN_FORN'],
+        'id': ['COD_ID', 'PAC', 'UNI_TR_MT', 'CTMT'],
+    },
+    'SSDBT': {
+        'float': ['COMP'],
+        'category': ['FAS_CON', 'TIP_CND'],
+        'id': ['COD_ID', 'PAC_1', 'PAC_2', 'UNI_TR_MT', 'CTMT'],
+    },
+    'RAMLIG': {
+        'float': ['COMP'],
+        'category': ['FAS_CON', 'TIP_CND'],
+        'id': ['COD_ID', 'PAC_1', 'PAC_2', 'UNI_TR_MT', 'CTMT'],
+    },
+    'SEGCON': {
+        'float': ['R1', 'X1', 'CNOM', 'CMAX'],
+        'category': [],
+        'id': ['COD_ID'],
+    },
+    'CRVCRG': {
+        'float': POT_COLUMNS,
+        'category': ['TIP_DIA'],
+        'id': ['COD_ID'],
+    },
+    'UNTRMT': {
+        'float': [],
+        'category': ['FAS_CON_P', 'FAS_CON_S'],
+        'id': ['COD_ID', 'PAC_1', 'PAC_2', 'CTMT'],
+    },
+    'EQTRMT': {
+        'float': ['PER_TOT', 'PER_FER', 'XHL'],
+        'category': ['POT_NOM', 'TEN_PRI', 'TEN_SEC'],
+        'id': ['COD_ID', 'UNI_TR_MT'],
+    },
+}
+
+# Função para obter o tipo declarado de cada coluna de uma tabela ({coluna: tipo})
+def column_types(table_name):
+    schema = BDGD_SCHEMA.get(table_name, {})
+    return {column: kind for kind, columns in schema.items() for column in columns}
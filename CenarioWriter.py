@@ -2,13 +2,26 @@ import os
 import sys
 import shutil
 import time
+import statistics
 import importlib.util
 from datetime import datetime
 import importlib.machinery
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from ScenarioStore import ScenarioStore
+from ScenarioCatalog import ScenarioCatalog, file_hash, PENDING, GENERATING, GENERATED, FAILED
 
 # Definição do diretório base para salvar os cenários
 BASE_PATH = r'C:\DSSFiles3'
 
+# Diretório do arquivo base da rede, compartilhado por todos os cenários (incluído por Redirect)
+BASE_INCLUDE_PATH = os.path.join(BASE_PATH, 'Base')
+
+# Armazenamento compacto dos cenários (UCs com EV/GD de cada cenário em um único arquivo)
+STORE_PATH = os.path.join(BASE_PATH, 'scenarios.npz')
+
+# Catálogo dos cenários (estado de geração, solução e agregação de cada cenário)
+CATALOG_PATH = os.path.join(BASE_PATH, 'scenarios.sqlite')
+
 # Caminho para o arquivo original
 ORIGINAL_SCRIPT_PATH = r'C:\Users\bruno\OneDrive\Área de Trabalho\TCC\PYTHON\DSSWriter3.2.py'
 
@@ -17,6 +30,26 @@ EV_PERCENTAGES = [0, 25, 50, 75, 100]  # Percentuais de EV
 GD_PERCENTAGES = [0, 25, 50, 75, 100]  # Percentuais de GD
 RANDOM_SEEDS = list(range(1, 52))  # Random seeds de 1 a 51
 
+# Gerar (e resolver) uma única vez os cenários com o mesmo posicionamento de EV/GD;
+# os demais ficam no catálogo como alias do primeiro
+DEDUPLICATE_SCENARIOS = True
+
+# Geração adaptativa (--adaptive): em cada combinação de GD e EV, as sementes são geradas e
+# resolvidas em lotes até que o intervalo de confiança de todas as métricas fique dentro do
+# alvo (meia largura) ou até acabarem as sementes de RANDOM_SEEDS
+ADAPTIVE_MIN_SEEDS = 5   # Sementes do primeiro lote de cada combinação
+ADAPTIVE_BATCH = 5       # Sementes acrescentadas por rodada enquanto não convergir
+ADAPTIVE_Z = 1.96        # Confiança de 95%
+ADAPTIVE_TARGETS = {
+    'max_v_pu': 0.005,   # Tensão máxima (p.u.)
+    'min_v_pu': 0.005,   # Tensão mínima (p.u.)
+    'overload': 0.05,    # Probabilidade de sobrecarga em algum transformador
+}
+OVERLOAD_LIMIT = 1.0     # Carregamento (p.u. da potência nominal) acima do qual há sobrecarga
+
+# Script do DSS Solver, usado pela geração adaptativa para resolver cada lote
+SOLVER_SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'DSS Solver.py')
+
 # Função para registrar logs
 def log_progress(message, log_file=None):
     """Registra mensagens de progresso na tela e em arquivo"""
@@ -36,12 +69,9 @@ def create_scenario_directory(gd_percentage, ev_percentage, random_seed):
     if not os.path.exists(BASE_PATH):
         os.makedirs(BASE_PATH)
     
-    # Criar diretório do cenário
-    if not os.path.exists(scenario_path):
-        os.makedirs(scenario_path)
-    else:
-        log_progress(f"Diretório já existe: {scenario_path} - pulando")
-        return None
+    # Criar diretório do cenário (o catálogo decide se o cenário precisa ser gerado; um
+    # diretório que sobrou de uma execução interrompida é reaproveitado e sobrescrito)
+    os.makedirs(scenario_path, exist_ok=True)
         
     # Criar subdiretório DSS
     os.makedirs(os.path.join(scenario_path, 'DSS'), exist_ok=True)
@@ -64,118 +94,332 @@ def load_original_module():
     
     return module
 
-def run_dsswriter_for_scenario(gd_percentage, ev_percentage, random_seed):
-    """Executa o DSSWriter para um cenário específico"""
+# Gerador de cenários do DSSWriter (módulo e rede carregados uma única vez por processo)
+_scenario_generator = None
+
+def get_scenario_generator():
+    """Carrega o DSSWriter e a rede do escopo na primeira chamada e reaproveita nas seguintes"""
+    global _scenario_generator
+    if _scenario_generator is None:
+        original_module = load_original_module()
+        setattr(original_module, 'BASE_INCLUDE_PATH', BASE_INCLUDE_PATH)
+        _scenario_generator = original_module.ScenarioGenerator()
+        # No modo 'nested', sortear de uma vez as UCs de todas as sementes e percentuais
+        if getattr(original_module, 'PLACEMENT_MODE', None) == 'nested':
+            _scenario_generator.prepare(sorted(set(RANDOM_SEEDS) | {1}), EV_PERCENTAGES, GD_PERCENTAGES)
+    return _scenario_generator
+
+# Armazenamento de cenários lido uma única vez por processo
+_scenario_store = None
+
+def get_scenario_store():
+    """Abre o armazenamento de cenários (STORE_PATH) conferindo as UCs com a rede carregada"""
+    global _scenario_store
+    if _scenario_store is None:
+        _scenario_store = ScenarioStore(STORE_PATH, get_scenario_generator().load_keys())
+    return _scenario_store
+
+def run_dsswriter_for_scenario(gd_percentage, ev_percentage, random_seed, from_store=False):
+    """
+    Executa o DSSWriter para um cenário específico (sorteando ou lendo do armazenamento)
+    e retorna o caminho do arquivo DSS gerado
+    """
     # Criar diretório para o cenário
     scenario_path = create_scenario_directory(gd_percentage, ev_percentage, random_seed)
-    if scenario_path is None:
-        return False
     
-    # Carregar o módulo original
+    # Gerar o cenário com a rede já carregada
+    selection = None
+    if from_store:
+        selection = get_scenario_store().selection(gd_percentage, ev_percentage, random_seed)
+    return get_scenario_generator().generate({
+        'EVSpread': ev_percentage,
+        'GDSpread': gd_percentage,
+        'random_seed': random_seed,
+        'DSS_PATH': os.path.join(scenario_path, 'DSS'),
+    }, selection=selection)
+
+def scenario_seeds(gd_percentage, ev_percentage, seeds):
+    """Random seeds usadas por uma combinação de GD e EV"""
+    if (gd_percentage == 0 or gd_percentage == 100) and (ev_percentage == 0 or ev_percentage == 100):
+        # Para 0% ou 100% de GD e EV, só use random_seed=1
+        return [1]
+    # Para outros casos, use todos os random seeds
+    return seeds
+
+def scenario_grid(gd_values, ev_values, seeds):
+    """Lista de cenários (GD, EV, RS) na ordem de geração"""
+    return [(gd_percentage, ev_percentage, random_seed)
+            for gd_percentage in gd_values
+            for ev_percentage in ev_values
+            for random_seed in scenario_seeds(gd_percentage, ev_percentage, seeds)]
+
+def run_scenario_task(scenario, mode='dss'):
+    """
+    Gera um cenário e retorna (cenário, resultado, dados para o catálogo), com resultado
+    'success' (dados: dss_path, dss_hash, generate_seconds) ou 'error' (dados: error)
+    """
+    gd_percentage, ev_percentage, random_seed = scenario
+    start_time = time.time()
     try:
-        original_module = load_original_module()
-        
-        # Salvar valores originais para restaurar depois
-        original_evspread = getattr(original_module, 'EVSpread', 100)
-        original_gdspread = getattr(original_module, 'GDSpread', 100)
-        original_random_seed = getattr(original_module, 'random_seed', 1)
-        original_dss_path = getattr(original_module, 'DSS_PATH', r'C:\Users\bruno\OneDrive\Área de Trabalho\TCC\PYTHON\DSS')
-        
-        # Modificar variáveis para o cenário atual
-        setattr(original_module, 'EVSpread', ev_percentage)
-        setattr(original_module, 'GDSpread', gd_percentage)
-        setattr(original_module, 'random_seed', random_seed)
-        setattr(original_module, 'DSS_PATH', os.path.join(scenario_path, 'DSS'))
-        
-        # Executar a função generate_dss do módulo original
-        original_module.generate_dss()
-        
-        # Restaurar valores originais
-        setattr(original_module, 'EVSpread', original_evspread)
-        setattr(original_module, 'GDSpread', original_gdspread)
-        setattr(original_module, 'random_seed', original_random_seed)
-        setattr(original_module, 'DSS_PATH', original_dss_path)
-        
-        return True
+        dss_path = run_dsswriter_for_scenario(gd_percentage, ev_percentage, random_seed, from_store=(mode == 'materialize'))
+        return scenario, 'success', {
+            'dss_path': dss_path,
+            'dss_hash': file_hash(dss_path),
+            'generate_seconds': time.time() - start_time,
+        }
     except Exception as e:
         log_progress(f"Erro ao processar cenário GD={gd_percentage}, EV={ev_percentage}, RS={random_seed}: {str(e)}")
-        return False
+        return scenario, 'error', {'error': str(e)}
 
-def generate_all_scenarios():
-    """Gera todos os cenários definidos nas configurações"""
-    # Criar arquivo de log
-    log_file = os.path.join(BASE_PATH, "scenario_generation.log")
-    with open(log_file, 'w') as f:
-        f.write(f"Iniciando geração de cenários em {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+def store_scenarios(scenarios, log_file):
+    """Sorteia os cenários e grava apenas as UCs com EV/GD de cada um no armazenamento (STORE_PATH)"""
+    generator = get_scenario_generator()
+    store = get_scenario_store()
+    start_time = time.time()
+    new_scenarios = [scenario for scenario in scenarios if scenario not in store]
+    log_progress(f"Armazenando {len(new_scenarios)} cenários ({len(scenarios) - len(new_scenarios)} já armazenados) em {STORE_PATH}", log_file)
     
-    # Calcular número total de cenários
-    # Ajuste para considerar que casos com 0% ou 100% só usam random_seed=1
-    total_scenarios = 0
-    for gd_percentage in GD_PERCENTAGES:
-        for ev_percentage in EV_PERCENTAGES:
-            if (gd_percentage == 0 or gd_percentage == 100) and (ev_percentage == 0 or ev_percentage == 100):
-                # Para 0% ou 100% de GD e EV, só use random_seed=1
-                total_scenarios += 1
-            else:
-                # Para outros casos, use todos os random seeds
-                total_scenarios += len(RANDOM_SEEDS)
+    for gd_percentage, ev_percentage, random_seed in new_scenarios:
+        selection = generator.select({
+            'EVSpread': ev_percentage,
+            'GDSpread': gd_percentage,
+            'random_seed': random_seed,
+        })
+        store.add(gd_percentage, ev_percentage, random_seed, selection)
+    store.save()
     
-    log_progress(f"Total de cenários a serem gerados: {total_scenarios}", log_file)
+    total_time = time.time() - start_time
+    log_progress(f"Armazenamento concluído em {total_time:.1f} segundos: {len(store)} cenários em {STORE_PATH}", log_file)
+
+def deduplicate_scenarios(catalog, scenarios, mode='dss'):
+    """
+    Calcula o hash do posicionamento de cada cenário e separa os que precisam ser gerados
+    dos equivalentes a um cenário já catalogado (marcados como alias no catálogo).
+    Retorna (cenários a gerar, quantidade de alias)
+    """
+    generator = get_scenario_generator()
+    unique_scenarios = []
+    aliased = 0
+    for scenario in scenarios:
+        gd_percentage, ev_percentage, random_seed = scenario
+        selection = None
+        if mode == 'materialize':
+            selection = get_scenario_store().selection(gd_percentage, ev_percentage, random_seed)
+        placement_hash = generator.fingerprint({
+            'EVSpread': ev_percentage,
+            'GDSpread': gd_percentage,
+            'random_seed': random_seed,
+        }, selection)
+        
+        canonical = catalog.canonical_for(placement_hash, scenario)
+        if canonical is None:
+            catalog.mark(scenario, GENERATING, placement_hash=placement_hash)
+            unique_scenarios.append(scenario)
+        else:
+            catalog.alias(scenario, canonical, placement_hash)
+            aliased += 1
+    return unique_scenarios, aliased
+
+def init_worker():
+    """Inicializa um processo do pool carregando o DSSWriter e a rede uma única vez"""
+    get_scenario_generator()
+
+def run_scenarios(scenarios, log_file, jobs=1, mode='dss'):
+    """
+    Gera a lista de cenários, em sequência (jobs=1) ou distribuída em um pool de processos,
+    registrando progresso, tempo estimado e estatísticas de forma centralizada.
+    mode: 'dss' (sortear e escrever os arquivos), 'store' (apenas gravar no armazenamento
+    compacto) ou 'materialize' (escrever os arquivos a partir do armazenamento)
+    """
+    if mode == 'store':
+        store_scenarios(scenarios, log_file)
+        return
+
+    # Registrar os cenários no catálogo, devolver a "pendente" os que ficaram pela metade
+    # em uma execução interrompida e pegar os que ainda precisam ser gerados
+    catalog = ScenarioCatalog(CATALOG_PATH)
+    catalog.register(scenarios)
+    recovered = catalog.recover([GENERATING])
+    if recovered:
+        log_progress(f"{recovered} cenários interrompidos durante a geração voltaram para a fila", log_file)
+    claimed = catalog.claim([PENDING], GENERATING, scenarios, retry_stage='generate')
+    skipped = len(scenarios) - len(claimed)
+
+    # Cenários com o mesmo circuito de outro já catalogado não são gerados novamente
+    aliased = 0
+    if DEDUPLICATE_SCENARIOS and claimed:
+        claimed, aliased = deduplicate_scenarios(catalog, claimed, mode)
+        log_progress(f"{aliased} cenários equivalentes a outros (mesmo posicionamento de EV/GD) registrados como alias", log_file)
+
+    total_scenarios = len(claimed)
+    log_progress(f"Total de cenários a serem gerados: {total_scenarios} ({skipped} já gerados segundo o catálogo)", log_file)
+    if jobs > 1:
+        log_progress(f"Gerando em paralelo com {jobs} processos", log_file)
     
     # Contadores para estatísticas
+    counts = {'success': 0, 'skip': skipped + aliased, 'error': 0}
     scenario_count = 0
-    success_count = 0
-    skip_count = 0
-    error_count = 0
     
     # Registrar tempo de início
     start_time = time.time()
+
+    def record(scenario, status, fields):
+        nonlocal scenario_count
+        scenario_count += 1
+        counts[status] += 1
+        if status == 'success':
+            catalog.mark(scenario, GENERATED, failed_stage=None, error=None, **fields)
+        else:
+            released = catalog.mark(scenario, FAILED, failed_stage='generate', **fields)
+            if released:
+                log_progress(f"{released} alias do cenário {scenario} voltaram para a fila (serão gerados na próxima execução)", log_file)
+        gd_percentage, ev_percentage, random_seed = scenario
+        if jobs > 1:
+            log_progress(f"Cenário concluído ({status}): GD={gd_percentage}%, EV={ev_percentage}%, RS={random_seed}", log_file)
+
+        # Calcular progresso e tempo estimado restante (apenas cenários gerados nesta execução)
+        elapsed_time = time.time() - start_time
+        avg_time_per_scenario = elapsed_time / scenario_count
+        remaining_scenarios = total_scenarios - scenario_count
+        estimated_remaining_time = avg_time_per_scenario * remaining_scenarios
+        
+        # Registrar progresso
+        log_progress(f"Progresso: {scenario_count}/{total_scenarios} ({scenario_count/total_scenarios*100:.1f}%)", log_file)
+        log_progress(f"Tempo estimado restante: {estimated_remaining_time/60:.1f} minutos", log_file)
+        log_progress(f"Estatísticas: {counts['success']} sucessos, {counts['skip']} ignorados, {counts['error']} erros", log_file)
+
+    if jobs > 1:
+        # Cada processo carrega a rede uma vez (init_worker) e recebe cenários conforme termina os anteriores
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker) as executor:
+            futures = {executor.submit(run_scenario_task, scenario, mode): scenario for scenario in claimed}
+            for future in as_completed(futures):
+                try:
+                    scenario, status, fields = future.result()
+                except Exception as e:
+                    scenario, status, fields = futures[future], 'error', {'error': str(e)}
+                    log_progress(f"Erro no processo de geração: {str(e)}", log_file)
+                record(scenario, status, fields)
+    else:
+        for scenario_index, scenario in enumerate(claimed, 1):
+            gd_percentage, ev_percentage, random_seed = scenario
+            log_progress(f"Processando cenário {scenario_index}/{total_scenarios}: GD={gd_percentage}%, EV={ev_percentage}%, RS={random_seed}", log_file)
+            record(*run_scenario_task(scenario, mode))
     
-    # Gerar todos os cenários
-    for gd_percentage in GD_PERCENTAGES:
-        for ev_percentage in EV_PERCENTAGES:
-            # Determinar quais random seeds usar para este cenário
-            if (gd_percentage == 0 or gd_percentage == 100) and (ev_percentage == 0 or ev_percentage == 100):
-                # Para 0% ou 100% de GD e EV, só use random_seed=1
-                seeds_to_use = [1]
-            else:
-                # Para outros casos, use todos os random seeds
-                seeds_to_use = RANDOM_SEEDS
-            
-            for random_seed in seeds_to_use:
-                scenario_count += 1
-                
-                log_progress(f"Processando cenário {scenario_count}/{total_scenarios}: GD={gd_percentage}%, EV={ev_percentage}%, RS={random_seed}", log_file)
-                
-                # Executar o DSSWriter para este cenário
-                success = run_dsswriter_for_scenario(gd_percentage, ev_percentage, random_seed)
-                
-                if success:
-                    success_count += 1
-                else:
-                    # Verificar se é um erro ou se o diretório já existia
-                    if os.path.exists(os.path.join(BASE_PATH, f"GD{gd_percentage}--EV{ev_percentage}--RS{random_seed}")):
-                        skip_count += 1
-                    else:
-                        error_count += 1
-                
-                # Calcular progresso e tempo estimado restante
-                elapsed_time = time.time() - start_time
-                avg_time_per_scenario = elapsed_time / scenario_count
-                remaining_scenarios = total_scenarios - scenario_count
-                estimated_remaining_time = avg_time_per_scenario * remaining_scenarios
-                
-                # Registrar progresso
-                log_progress(f"Progresso: {scenario_count}/{total_scenarios} ({scenario_count/total_scenarios*100:.1f}%)", log_file)
-                log_progress(f"Tempo estimado restante: {estimated_remaining_time/60:.1f} minutos", log_file)
-                log_progress(f"Estatísticas: {success_count} sucessos, {skip_count} ignorados, {error_count} erros", log_file)
-    
+    catalog.close()
+
     # Registrar estatísticas finais
     total_time = time.time() - start_time
     log_progress(f"Geração de cenários concluída em {total_time/60:.1f} minutos", log_file)
-    log_progress(f"Total: {scenario_count} cenários | {success_count} sucessos | {skip_count} ignorados | {error_count} erros", log_file)
+    log_progress(f"Total: {scenario_count} cenários | {counts['success']} sucessos | {counts['skip']} ignorados | {counts['error']} erros", log_file)
+
+def load_solver_module():
+    """
+    Carrega o DSS Solver como biblioteca (o nome do arquivo tem espaço), registrado como
+    'dss_solver' para que as tarefas do pool de solução possam ser enviadas aos processos
+    """
+    if 'dss_solver' not in sys.modules:
+        spec = importlib.util.spec_from_file_location('dss_solver', SOLVER_SCRIPT_PATH)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules['dss_solver'] = module
+        spec.loader.exec_module(module)
+    return sys.modules['dss_solver']
+
+def init_solver_worker():
+    """Inicializa um processo do pool de solução carregando o DSS Solver e a sua instância do OpenDSS"""
+    load_solver_module().init_worker()
 
-def generate_subset_scenarios(gd_values=None, ev_values=None, rs_start=1, rs_end=51):
+def confidence_half_widths(rows):
+    """
+    Meia largura do intervalo de confiança de cada métrica de ADAPTIVE_TARGETS a partir das
+    linhas do catálogo dos cenários resolvidos de uma combinação de GD e EV (None se ainda
+    não há amostras suficientes). Tensões: z·s/√n; sobrecarga: meia largura do intervalo
+    de Wilson, z·√(p(1-p)/n + z²/4n²) / (1 + z²/n), que não se anula com p = 0 ou p = 1
+    """
+    samples = {
+        'max_v_pu': [row['max_v_pu'] for row in rows if row['max_v_pu'] is not None],
+        'min_v_pu': [row['min_v_pu'] for row in rows if row['min_v_pu'] is not None],
+        'overload': [float(row['max_loading'] > OVERLOAD_LIMIT) for row in rows if row['max_loading'] is not None],
+    }
+    half_widths = {}
+    for metric in ADAPTIVE_TARGETS:
+        values = samples[metric]
+        if len(values) < 2:
+            half_widths[metric] = None
+        elif metric == 'overload':
+            n = len(values)
+            p = sum(values) / n
+            z2 = ADAPTIVE_Z ** 2
+            half_widths[metric] = ADAPTIVE_Z * (p * (1 - p) / n + z2 / (4 * n ** 2)) ** 0.5 / (1 + z2 / n)
+        else:
+            half_widths[metric] = ADAPTIVE_Z * statistics.stdev(values) / len(values) ** 0.5
+    return half_widths
+
+def run_adaptive_scenarios(gd_values, ev_values, seeds, log_file, jobs=1):
+    """
+    Gera e resolve os cenários em rodadas, acrescentando sementes apenas às combinações de
+    GD e EV cujas métricas ainda não convergiram (ver ADAPTIVE_TARGETS)
+    """
+    solver = load_solver_module()
+    cells = {(gd_percentage, ev_percentage): scenario_seeds(gd_percentage, ev_percentage, seeds)
+             for gd_percentage in gd_values for ev_percentage in ev_values}
+    used = {cell: 0 for cell in cells}
+    active = sorted(cells)
+    round_number = 0
+
+    while active:
+        round_number += 1
+        batch = []
+        for cell in active:
+            step = ADAPTIVE_MIN_SEEDS if used[cell] == 0 else ADAPTIVE_BATCH
+            new_seeds = cells[cell][used[cell]:used[cell] + step]
+            used[cell] += len(new_seeds)
+            batch += [(*cell, random_seed) for random_seed in new_seeds]
+        log_progress(f"Rodada adaptativa {round_number}: {len(active)} combinações ativas, {len(batch)} cenários novos", log_file)
+
+        # Gerar e resolver o lote (incluindo os cenários canônicos dos alias, se ainda não resolvidos)
+        run_scenarios(batch, log_file, jobs)
+        catalog = ScenarioCatalog(CATALOG_PATH)
+        to_solve = sorted({catalog.resolve(scenario) for scenario in batch})
+        catalog.close()
+        solver.solve_catalog_scenarios(to_solve, CATALOG_PATH, jobs, init_solver_worker)
+
+        # Manter ativas apenas as combinações que não convergiram e ainda têm sementes
+        catalog = ScenarioCatalog(CATALOG_PATH)
+        still_active = []
+        for cell in active:
+            gd_percentage, ev_percentage = cell
+            rows = catalog.metrics([(*cell, random_seed) for random_seed in cells[cell][:used[cell]]]).values()
+            half_widths = confidence_half_widths(rows)
+            converged = all(half_widths[metric] is not None and half_widths[metric] <= target
+                            for metric, target in ADAPTIVE_TARGETS.items())
+            if converged or used[cell] >= len(cells[cell]):
+                reason = "convergiu" if converged else "semente única" if len(cells[cell]) == 1 else "sementes esgotadas"
+                widths = ", ".join(f"{metric}=±{width:.4f}" if width is not None else f"{metric}=n/d"
+                                   for metric, width in half_widths.items())
+                log_progress(f"GD={gd_percentage}%, EV={ev_percentage}%: {reason} com {used[cell]} sementes ({widths})", log_file)
+            else:
+                still_active.append(cell)
+        catalog.close()
+        active = still_active
+
+    total_used = sum(used.values())
+    total_grid = sum(len(cell_seeds) for cell_seeds in cells.values())
+    log_progress(f"Geração adaptativa concluída: {total_used} de {total_grid} cenários ({total_used/total_grid*100:.1f}%)", log_file)
+
+def generate_all_scenarios(jobs=1, mode='dss'):
+    """Gera todos os cenários definidos nas configurações"""
+    # Criar arquivo de log
+    log_file = os.path.join(BASE_PATH, "scenario_generation.log")
+    with open(log_file, 'w') as f:
+        f.write(f"Iniciando geração de cenários em {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    
+    # Ajuste para considerar que casos com 0% ou 100% só usam random_seed=1
+    if mode == 'adaptive':
+        run_adaptive_scenarios(GD_PERCENTAGES, EV_PERCENTAGES, RANDOM_SEEDS, log_file, jobs)
+        return
+    run_scenarios(scenario_grid(GD_PERCENTAGES, EV_PERCENTAGES, RANDOM_SEEDS), log_file, jobs, mode)
+
+def generate_subset_scenarios(gd_values=None, ev_values=None, rs_start=1, rs_end=51, jobs=1, mode='dss'):
     """
     Gera um subconjunto de cenários com os valores especificados
     
@@ -184,6 +428,9 @@ def generate_subset_scenarios(gd_values=None, ev_values=None, rs_start=1, rs_end
         ev_values (list): Lista de percentuais de EV a serem gerados (default: todos)
         rs_start (int): Valor inicial de random seed (default: 1)
         rs_end (int): Valor final de random seed (default: 51)
+        jobs (int): Número de processos em paralelo (default: 1)
+        mode (str): 'dss', 'store', 'materialize' (ver run_scenarios) ou 'adaptive'
+            (ver run_adaptive_scenarios)
     """
     # Usar valores padrão se não especificados
     gd_values = gd_values if gd_values is not None else GD_PERCENTAGES
@@ -198,70 +445,11 @@ def generate_subset_scenarios(gd_values=None, ev_values=None, rs_start=1, rs_end
         f.write(f"EV: {ev_values}\n")
         f.write(f"RS: {rs_start} a {rs_end}\n")
     
-    # Calcular número total de cenários (ajustado para casos 0% e 100%)
-    total_scenarios = 0
-    for gd_percentage in gd_values:
-        for ev_percentage in ev_values:
-            if (gd_percentage == 0 or gd_percentage == 100) and (ev_percentage == 0 or ev_percentage == 100):
-                # Para 0% ou 100% de GD e EV, só use random_seed=1
-                total_scenarios += 1
-            else:
-                # Para outros casos, use todos os random seeds especificados
-                total_scenarios += len(rs_values)
-    
-    log_progress(f"Total de cenários a serem gerados: {total_scenarios}", log_file)
-    
-    # Contadores para estatísticas
-    scenario_count = 0
-    success_count = 0
-    skip_count = 0
-    error_count = 0
-    
-    # Registrar tempo de início
-    start_time = time.time()
-    
-    # Gerar todos os cenários do subconjunto
-    for gd_percentage in gd_values:
-        for ev_percentage in ev_values:
-            # Determinar quais random seeds usar para este cenário
-            if (gd_percentage == 0 or gd_percentage == 100) and (ev_percentage == 0 or ev_percentage == 100):
-                # Para 0% ou 100% de GD e EV, só use random_seed=1
-                seeds_to_use = [1]
-            else:
-                # Para outros casos, use todos os random seeds especificados
-                seeds_to_use = rs_values
-            
-            for random_seed in seeds_to_use:
-                scenario_count += 1
-                
-                log_progress(f"Processando cenário {scenario_count}/{total_scenarios}: GD={gd_percentage}%, EV={ev_percentage}%, RS={random_seed}", log_file)
-                
-                # Executar o DSSWriter para este cenário
-                success = run_dsswriter_for_scenario(gd_percentage, ev_percentage, random_seed)
-                
-                if success:
-                    success_count += 1
-                else:
-                    # Verificar se é um erro ou se o diretório já existia
-                    if os.path.exists(os.path.join(BASE_PATH, f"GD{gd_percentage}--EV{ev_percentage}--RS{random_seed}")):
-                        skip_count += 1
-                    else:
-                        error_count += 1
-                
-                # Calcular progresso e tempo estimado restante
-                elapsed_time = time.time() - start_time
-                avg_time_per_scenario = elapsed_time / scenario_count
-                remaining_scenarios = total_scenarios - scenario_count
-                estimated_remaining_time = avg_time_per_scenario * remaining_scenarios
-                
-                # Registrar progresso
-                log_progress(f"Progresso: {scenario_count}/{total_scenarios} ({scenario_count/total_scenarios*100:.1f}%)", log_file)
-                log_progress(f"Tempo estimado restante: {estimated_remaining_time/60:.1f} minutos", log_file)
-    
-    # Registrar estatísticas finais
-    total_time = time.time() - start_time
-    log_progress(f"Geração de cenários concluída em {total_time/60:.1f} minutos", log_file)
-    log_progress(f"Total: {scenario_count} cenários | {success_count} sucessos | {skip_count} ignorados | {error_count} erros", log_file)
+    # Casos com 0% ou 100% de GD e EV só usam random_seed=1
+    if mode == 'adaptive':
+        run_adaptive_scenarios(gd_values, ev_values, rs_values, log_file, jobs)
+        return
+    run_scenarios(scenario_grid(gd_values, ev_values, rs_values), log_file, jobs, mode)
 
 if __name__ == "__main__":
     # Verificar argumentos da linha de comando
@@ -274,13 +462,36 @@ if __name__ == "__main__":
             print("  --ev valores         Lista de valores de EV (ex: 0 25 50)")
             print("  --rs-start valor     Valor inicial de random seed (padrão: 1)")
             print("  --rs-end valor       Valor final de random seed (padrão: 51)")
+            print("  --jobs N             Número de processos em paralelo (padrão: 1)")
+            print("  --store              Gravar apenas as UCs com EV/GD no armazenamento compacto")
+            print("  --from-store         Escrever os arquivos DSS a partir do armazenamento compacto")
+            print("  --adaptive           Gerar e resolver sementes em lotes até as métricas convergirem")
             sys.exit(0)
         
+        # Processar --jobs
+        jobs = 1
+        if "--jobs" in sys.argv:
+            idx = sys.argv.index("--jobs")
+            if idx + 1 < len(sys.argv):
+                try:
+                    jobs = max(1, int(sys.argv[idx + 1]))
+                except ValueError:
+                    pass
+
+        # Processar --store / --from-store
+        mode = 'dss'
+        if "--store" in sys.argv:
+            mode = 'store'
+        elif "--from-store" in sys.argv:
+            mode = 'materialize'
+        elif "--adaptive" in sys.argv:
+            mode = 'adaptive'
+
         # Processar argumentos
         if "--all" in sys.argv:
             # Gerar todos os cenários
             print("Gerando todos os cenários...")
-            generate_all_scenarios()
+            generate_all_scenarios(jobs, mode)
         else:
             # Gerar subconjunto de cenários
             gd_values = None
@@ -337,7 +548,7 @@ if __name__ == "__main__":
             print(f"  GD: {gd_values if gd_values else GD_PERCENTAGES}")
             print(f"  EV: {ev_values if ev_values else EV_PERCENTAGES}")
             print(f"  RS: {rs_start} a {rs_end}")
-            generate_subset_scenarios(gd_values, ev_values, rs_start, rs_end)
+            generate_subset_scenarios(gd_values, ev_values, rs_start, rs_end, jobs, mode)
     else:
         # Sem argumentos - gerar todos os cenários
         print("Gerando todos os cenários...")
@@ -1,8 +1,17 @@
 import fiona
 import csv
+import hashlib
+import json
 import os
-import pandas as pd
+import shutil
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pyarrow as pa
+import pyarrow.parquet as pq
+from shapely.geometry import shape
 from tqdm import tqdm
+from BDGDSchema import column_types
 
 # Caminho para o arquivo .gdb e tabelas específicas
 gdb_path = r"C:\Users\bruno\OneDrive\Área de Trabalho\TCC\inputs\EMT2023\Energisa_MT_405_2023-12-31_V11_20240612-1317.gdb"
@@ -12,63 +21,558 @@ tables = [
 ]
 output_dir = r"C:\Users\bruno\OneDrive\Área de Trabalho\TCC\outputteste"
 
-try:
-    print("🚀 Iniciando o processo de conversão das tabelas para CSV...")
+# Formato de saída: 'parquet' (colunar e tipado) ou 'csv' (formato antigo)
+output_format = 'parquet'
+
+# Quantidade de registros lidos e gravados por lote (limita o uso de memória)
+chunk_size = 50000
+
+# Número de processos para converter as camadas em paralelo (1 = sequencial)
+workers = os.cpu_count() or 1
+
+# Camadas com mais feições que isso são divididas em faixas convertidas em paralelo
+split_size = 500000
+
+# Manifesto com a impressão digital de cada camada convertida: camadas sem
+# alteração desde a última execução não são convertidas novamente
+manifest_file = os.path.join(output_dir, "manifest.json")
+
+# Se o GDB mudou de caminho/data mas a camada tem o mesmo esquema e número de
+# feições, compara o conteúdo (hash) antes de reconverter (ex.: nova versão da BDGD)
+verify_content = True
+
+# Força a reconversão de todas as camadas, ignorando o manifesto
+force = False
+
+# Escopo da extração: transformadores (UNI_TR_MT) e/ou alimentadores (CTMT).
+# Com as duas listas vazias a distribuidora inteira é extraída. Com escopo, camadas de
+# média tensão sem coluna de transformador vêm apenas dos alimentadores do escopo e
+# camadas sem coluna de transformador nem de alimentador não são extraídas.
+escopo_alvo = []
+escopo_ctmt = []
+
+# Coluna que identifica o transformador/alimentador quando não é a padrão
+TRANSFORMER_COLUMNS = {'UNTRMT': 'COD_ID'}
+FEEDER_COLUMNS = {'CTMT': 'COD_ID'}
+
+# Alimentadores dos transformadores do escopo (tabela, coluna): com escopo_alvo, as camadas
+# sem coluna de transformador (SSDMT, PONNOT, CTMT...) são filtradas por esses alimentadores
+FEEDER_SCOPE_SOURCE = ('UNTRMT', 'CTMT')
+
+# Tabelas filtradas pelos códigos referenciados em outras tabelas do escopo:
+# tabela -> (coluna filtrada, [(tabela de origem, coluna de origem), ...])
+SCOPE_DEPENDENCIES = {
+    'EQTRMT': ('UNI_TR_MT', [('UNTRMT', 'COD_ID')]),
+    'SEGCON': ('COD_ID', [('SSDBT', 'TIP_CND'), ('RAMLIG', 'TIP_CND'), ('SSDMT', 'TIP_CND')]),
+    'CRVCRG': ('COD_ID', [('UCBT_tab', 'TIP_CC'), ('UGBT_tab', 'TIP_CC')]),
+}
+
+# Tipos do esquema do Fiona convertidos para tipos do Arrow
+FIONA_ARROW_TYPES = {
+    'str': pa.string(),
+    'int': pa.int64(),
+    'int32': pa.int32(),
+    'int64': pa.int64(),
+    'float': pa.float64(),
+    'date': pa.string(),
+    'time': pa.string(),
+    'datetime': pa.string(),
+}
+
+# Esquema do arquivo auxiliar de geometrias de cada camada espacial
+# (mesma ordem de linhas da tabela de atributos, geometria em WKB)
+GEOMETRY_SCHEMA = pa.schema([
+    pa.field('COD_ID', pa.string()),
+    pa.field('geometry', pa.binary()),
+])
+
+# Tipos do Arrow para os tipos declarados em BDGDSchema (códigos e identificadores
+# são gravados como dicionário e lidos pelo pandas como categoria)
+DECLARED_ARROW_TYPES = {
+    'float': pa.float64(),
+    'category': pa.dictionary(pa.int32(), pa.string()),
+    'id': pa.dictionary(pa.int32(), pa.string()),
+}
+
+# Função para montar o esquema Arrow da camada, aplicando os tipos declarados
+def build_arrow_schema(table_name, src_schema):
+    declared = column_types(table_name)
+    fields = []
+    for name, field_type in src_schema['properties'].items():
+        if name in declared:
+            arrow_type = DECLARED_ARROW_TYPES[declared[name]]
+        else:
+            arrow_type = FIONA_ARROW_TYPES.get(field_type.split(':')[0], pa.string())
+        fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields)
+
+# Função para listar as colunas cujo tipo na origem difere do tipo declarado
+# ({coluna: 'float' ou 'str'})
+def schema_casts(table_name, src_schema):
+    casts = {}
+    for name, kind in column_types(table_name).items():
+        field_type = src_schema['properties'].get(name)
+        if field_type is None:
+            continue
+        base_type = field_type.split(':')[0]
+        if kind == 'float' and base_type != 'float':
+            casts[name] = 'float'
+        elif kind != 'float' and base_type != 'str':
+            casts[name] = 'str'
+    return casts
+
+# Função para converter texto em número (aceita vírgula decimal; inválido vira nulo)
+def to_float(value):
+    if value is None or isinstance(value, float):
+        return value
+    try:
+        return float(str(value).replace(',', '.'))
+    except ValueError:
+        return None
+
+# Função para converter a geometria de uma feição em WKB
+def to_wkb(geometry):
+    return shape(geometry).wkb if geometry is not None else None
+
+# Função para ler as feições da camada em lotes de tamanho fixo
+# (guarda em refs os códigos das colunas referenciadas por outras tabelas,
+# atualiza o hash do conteúdo e entrega as geometrias de cada lote a geometry_sink)
+def iter_batches(features, pbar, refs, digest, casts, geometry_sink):
+    batch = []
+    geometries = []
+    for feature in features:
+        row = dict(feature['properties'])
+        for column, kind in casts.items():
+            value = row.get(column)
+            if kind == 'float':
+                row[column] = to_float(value)
+            elif value is not None:
+                row[column] = str(value)
+        for column, values in refs.items():
+            if row.get(column) is not None:
+                values.add(row[column])
+        digest.update(repr(tuple(row.values())).encode('utf-8'))
+        if geometry_sink is not None:
+            geometry = to_wkb(feature['geometry'])
+            if geometry is not None:
+                digest.update(geometry)
+            cod_id = row.get('COD_ID')
+            geometries.append({'COD_ID': str(cod_id) if cod_id is not None else None, 'geometry': geometry})
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            if geometry_sink is not None:
+                geometry_sink(geometries)
+                geometries = []
+            pbar.update(len(batch))
+            yield batch
+            batch = []
+    if batch:
+        if geometry_sink is not None:
+            geometry_sink(geometries)
+        pbar.update(len(batch))
+        yield batch
+
+# Função para verificar se algum escopo foi informado
+def scope_active():
+    return bool(escopo_alvo or escopo_ctmt)
+
+# Função para montar a cláusula SQL "coluna IN (...)" usada no filtro do OGR
+def sql_in(column, values):
+    quoted = ", ".join("'" + str(value).replace("'", "''") + "'" for value in sorted(values))
+    return f"{column} IN ({quoted})"
+
+# Função para verificar se a camada é filtrada pelos alimentadores dos transformadores
+# do escopo (e por isso só pode ser convertida depois de UNTRMT)
+def feeder_scoped(table_name, columns):
+    return (bool(escopo_alvo) and table_name not in SCOPE_DEPENDENCIES
+            and TRANSFORMER_COLUMNS.get(table_name, 'UNI_TR_MT') not in columns)
+
+# Função para montar o filtro de escopo de uma camada (None = camada inteira).
+# Camadas com coluna de transformador são filtradas por escopo_alvo; as demais, pelos
+# alimentadores de escopo_ctmt e pelos dos transformadores do escopo (FEEDER_SCOPE_SOURCE).
+# Camadas sem coluna de transformador nem de alimentador (ex.: BAR, UNTRAT, EQTRAT) não
+# são extraídas quando há escopo, em vez de virem inteiras
+def build_scope_filter(table_name, columns, refs):
+    if not scope_active():
+        return None
+
+    if table_name in SCOPE_DEPENDENCIES:
+        column, sources = SCOPE_DEPENDENCIES[table_name]
+        source_tables = [source for source in sources if source in refs]
+        if not source_tables:
+            return None  # Nenhuma tabela de origem convertida: extrai a camada inteira
+        values = set().union(*(refs[source] for source in source_tables))
+        return sql_in(column, values) if values else "1 = 0"
+
+    clauses = []
+    transformer_column = TRANSFORMER_COLUMNS.get(table_name, 'UNI_TR_MT')
+    if escopo_alvo and transformer_column in columns:
+        clauses.append(sql_in(transformer_column, escopo_alvo))
+    feeders = set(escopo_ctmt)
+    if feeder_scoped(table_name, columns):
+        feeders |= refs.get(FEEDER_SCOPE_SOURCE, set())
+    feeder_column = FEEDER_COLUMNS.get(table_name, 'CTMT')
+    if feeders and feeder_column in columns:
+        clauses.append(sql_in(feeder_column, feeders))
+    return " OR ".join(clauses) or "1 = 0"
+
+# Função para listar as colunas desta tabela referenciadas pelas tabelas dependentes
+def reference_columns(table_name):
+    if not scope_active():
+        return []
+    columns = {column for _, sources in SCOPE_DEPENDENCIES.values()
+               for source_table, column in sources if source_table == table_name}
+    if escopo_alvo and table_name == FEEDER_SCOPE_SOURCE[0]:
+        columns.add(FEEDER_SCOPE_SOURCE[1])
+    return sorted(columns)
+
+# Função para gravar a camada em Parquet, lote a lote
+def write_parquet(batches, schema, output_file):
+    tmp_file = output_file + '.tmp'
+    with pq.ParquetWriter(tmp_file, schema) as writer:
+        for batch in batches:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+    os.replace(tmp_file, output_file)
+
+# Função para gravar a camada em CSV, lote a lote
+def write_csv(batches, fieldnames, output_file, header=True):
+    tmp_file = output_file + '.tmp'
+    with open(tmp_file, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames, delimiter=';')
+        if header:
+            writer.writeheader()
+        for batch in batches:
+            writer.writerows(batch)
+    os.replace(tmp_file, output_file)
+
+# Função para obter a data de modificação mais recente dos arquivos do GDB
+def gdb_mtime():
+    if not os.path.isdir(gdb_path):
+        return os.path.getmtime(gdb_path)
+    return max((entry.stat().st_mtime for entry in os.scandir(gdb_path) if entry.is_file()),
+               default=os.path.getmtime(gdb_path))
+
+# Função para montar a impressão digital de uma camada na origem
+def layer_fingerprint(table_name, src, where, mtime, ref_columns):
+    schema_json = json.dumps(src.schema, sort_keys=True, default=str)
+    declared_json = json.dumps(column_types(table_name), sort_keys=True)
+    return {
+        'gdb_path': os.path.abspath(gdb_path),
+        'mtime': mtime,
+        'features': len(src),
+        'schema_hash': hashlib.sha1(schema_json.encode('utf-8')).hexdigest(),
+        'declared_schema': hashlib.sha1(declared_json.encode('utf-8')).hexdigest(),
+        'output_format': output_format,
+        'geometry_format': 'wkb',
+        'where': where,
+        'ref_columns': ref_columns,
+    }
+
+# Funções para ler e gravar o manifesto das conversões
+def load_manifest():
+    if force or not os.path.exists(manifest_file):
+        return {}
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Manifesto inválido ({e}). Todas as camadas serão convertidas.")
+        return {}
+
+def save_manifest(manifest):
+    tmp_file = manifest_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_file, manifest_file)
+
+# Função para classificar a camada em relação ao manifesto:
+# 'skip' (inalterada), 'verify' (comparar o conteúdo) ou 'convert'
+def check_layer(entry, fingerprint):
+    if not entry or not os.path.exists(entry['output']):
+        return 'convert'
+    if entry.get('geometry') and not os.path.exists(entry['geometry']):
+        return 'convert'
+    same_shape = all(entry['fingerprint'].get(key) == fingerprint[key]
+                     for key in ('features', 'schema_hash', 'declared_schema', 'output_format', 'geometry_format', 'where',
+                                 'ref_columns'))
+    if not same_shape:
+        return 'convert'
+    if entry['fingerprint']['gdb_path'] == fingerprint['gdb_path'] and entry['fingerprint']['mtime'] == fingerprint['mtime']:
+        return 'skip'
+    return 'verify' if verify_content and entry.get('content_hash') else 'convert'
+
+# Função para dividir as camadas em tarefas (camadas grandes viram várias faixas de feições)
+def plan_tasks(table_names, refs):
+    tasks = []
+    mtime = gdb_mtime()
+    for table_name in table_names:
+        with fiona.open(gdb_path, layer=table_name) as src:
+            total_features = len(src)
+            where = build_scope_filter(table_name, src.schema['properties'], refs)
+            fingerprint = layer_fingerprint(table_name, src, where, mtime, reference_columns(table_name))
+
+        # Camadas filtradas pelo escopo são pequenas e não são divididas
+        num_parts = 1 if where else max(1, -(-total_features // split_size))
+        for part in range(num_parts):
+            start = part * split_size
+            stop = min(start + split_size, total_features)
+            tasks.append({
+                'table_name': table_name,
+                'part': part,
+                'num_parts': num_parts,
+                'start': start,
+                'stop': stop,
+                'where': where,
+                'ref_columns': reference_columns(table_name),
+                'fingerprint': fingerprint,
+                'hash_only': False,
+            })
+    return tasks
+
+# Linha da barra de progresso do processo (None na execução sequencial, que usa uma só)
+_bar_position = None
+
+# Função para inicializar um processo do pool: lock do tqdm compartilhado e uma linha
+# fixa de barra de progresso por processo (0 a workers - 1)
+def init_worker(lock, slots):
+    global _bar_position
+    tqdm.set_lock(lock)
+    with slots.get_lock():
+        _bar_position = slots.value
+        slots.value += 1
+
+# Função executada por cada processo: converte uma faixa de feições de uma camada
+# (com hash_only, apenas lê a faixa para calcular o hash do conteúdo)
+def convert_part(task):
+    table_name, part, num_parts = task['table_name'], task['part'], task['num_parts']
+    output_file = os.path.join(output_dir, f"{table_name}.{output_format}")
+    geometry_file = os.path.join(output_dir, f"{table_name}.geometry.parquet")
+    suffix = f".part{part:03d}" if num_parts > 1 else ""
+    part_file = output_file + suffix
+    geometry_part_file = None
+    refs = {column: set() for column in task['ref_columns']}
+    digest = hashlib.sha1()
+    start_time = time.time()
+
+    with fiona.open(gdb_path, layer=table_name) as src:
+        schema = build_arrow_schema(table_name, src.schema)
+        casts = schema_casts(table_name, src.schema)
+
+        # Geometrias vão para um arquivo auxiliar em WKB, fora da tabela de atributos
+        geometry_writer = None
+        geometry_sink = None
+        if src.schema['geometry'] not in (None, 'None'):  # Tabelas sem geometria vêm como 'None'
+            if task['hash_only']:
+                geometry_sink = lambda rows: None
+            else:
+                geometry_part_file = geometry_file + suffix
+                geometry_writer = pq.ParquetWriter(geometry_part_file + '.tmp', GEOMETRY_SCHEMA)
+                geometry_sink = lambda rows: geometry_writer.write_table(pa.Table.from_pylist(rows, schema=GEOMETRY_SCHEMA))
+
+        if task['where']:
+            features = src.filter(where=task['where'])
+            total = None  # Quantidade de registros no escopo não é conhecida antes da leitura
+        elif num_parts > 1:
+            features = src.filter(task['start'], task['stop'])
+            total = task['stop'] - task['start']
+        else:
+            features = src
+            total = task['stop'] - task['start']
+
+        desc = f"{table_name} [{part + 1}/{num_parts}]" if num_parts > 1 else table_name
+        if task['hash_only']:
+            desc = f"Verificando {desc}"
+        with tqdm(total=total, desc=desc, unit="registro", ncols=100, position=_bar_position) as pbar:
+            batches = iter_batches(features, pbar, refs, digest, casts, geometry_sink)
+            try:
+                if task['hash_only']:
+                    for _ in batches:
+                        pass
+                elif output_format == 'parquet':
+                    write_parquet(batches, schema, part_file)
+                else:
+                    write_csv(batches, schema.names, part_file, header=(part == 0))
+            finally:
+                if geometry_writer is not None:
+                    geometry_writer.close()
+            if geometry_writer is not None:
+                os.replace(geometry_part_file + '.tmp', geometry_part_file)
+
+    return task, part_file, geometry_part_file, time.time() - start_time, refs, digest.hexdigest()
+
+# Função para juntar, em ordem, as partes de um arquivo de uma camada dividida
+def merge_parts(part_files, output_file):
+    tmp_file = output_file + '.tmp'
+
+    if output_file.endswith('.parquet'):
+        schema = pq.read_schema(part_files[0])
+        with pq.ParquetWriter(tmp_file, schema) as writer:
+            for part_file in part_files:
+                parquet_file = pq.ParquetFile(part_file)
+                for i in range(parquet_file.num_row_groups):
+                    writer.write_table(parquet_file.read_row_group(i))
+    else:
+        with open(tmp_file, 'wb') as merged:
+            for part_file in part_files:
+                with open(part_file, 'rb') as f:
+                    shutil.copyfileobj(f, merged)
+
+    os.replace(tmp_file, output_file)
+    for part_file in part_files:
+        os.remove(part_file)
+    return output_file
+
+# Função para acompanhar a conclusão das partes; devolve o resultado da camada quando
+# todas as suas partes terminaram (ou None enquanto faltam partes)
+def collect_result(result, parts_done):
+    task, part_file, geometry_part_file, elapsed, part_refs, part_hash = result
+    table_name, part, num_parts = task['table_name'], task['part'], task['num_parts']
+    layer = parts_done.setdefault(table_name, {'files': {}, 'geometry_files': {}, 'hashes': {}, 'refs': {}})
+    layer['files'][part] = part_file
+    layer['geometry_files'][part] = geometry_part_file
+    layer['hashes'][part] = part_hash
+    for column, values in part_refs.items():
+        layer['refs'].setdefault(column, set()).update(values)
+
+    if len(layer['files']) < num_parts:
+        if not task['hash_only']:
+            tqdm.write(f"✅ Parte {part + 1}/{num_parts} da tabela '{table_name}' concluída em {elapsed:.1f} s")
+        return None
+
+    del parts_done[table_name]
+    content_hash = hashlib.sha1("".join(layer['hashes'][i] for i in range(num_parts)).encode('utf-8')).hexdigest()
+    output_file = part_file
+    geometry_file = geometry_part_file
+    if not task['hash_only']:
+        if num_parts > 1:
+            output_file = merge_parts([layer['files'][i] for i in range(num_parts)],
+                                      os.path.join(output_dir, f"{table_name}.{output_format}"))
+            if geometry_part_file:
+                geometry_file = merge_parts([layer['geometry_files'][i] for i in range(num_parts)],
+                                            os.path.join(output_dir, f"{table_name}.geometry.parquet"))
+        tqdm.write(f"✅ Tabela '{table_name}' convertida com sucesso para: {output_file}")
+    return {
+        'table_name': table_name,
+        'output': output_file,
+        'geometry': geometry_file,
+        'fingerprint': task['fingerprint'],
+        'content_hash': content_hash,
+        'refs': layer['refs'],
+    }
+
+# Função para executar as tarefas (em paralelo se workers > 1); on_layer é chamada
+# com o resultado de cada camada concluída
+def run_tasks(tasks, on_layer):
+    parts_done = {}
+    if workers > 1:
+        # Cada parte roda em um processo próprio; as barras de progresso compartilham o lock do tqdm
+        slots = multiprocessing.Value('i', 0)
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(tqdm.get_lock(), slots)) as executor:
+            futures = [executor.submit(convert_part, task) for task in tasks]
+            for future in as_completed(futures):
+                layer = collect_result(future.result(), parts_done)
+                if layer:
+                    on_layer(layer)
+    else:
+        for task in tasks:
+            layer = collect_result(convert_part(task), parts_done)
+            if layer:
+                on_layer(layer)
+
+# Função para converter um grupo de camadas, reaproveitando as que não mudaram
+def convert_tables(table_names, manifest, refs):
+    tasks = plan_tasks(table_names, refs)
+    status = {}
+    for task in tasks:
+        table_name = task['table_name']
+        if table_name not in status:
+            status[table_name] = check_layer(manifest.get(table_name), task['fingerprint'])
+
+    def record(layer):
+        # Registra a camada no manifesto e guarda os códigos referenciados pelas tabelas dependentes
+        manifest[layer['table_name']] = {
+            'output': layer['output'],
+            'geometry': layer['geometry'],
+            'fingerprint': layer['fingerprint'],
+            'content_hash': layer['content_hash'],
+            'refs': {column: sorted(values) for column, values in layer['refs'].items()},
+            'converted_at': time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        save_manifest(manifest)
+        for column, values in layer['refs'].items():
+            refs[(layer['table_name'], column)] = set(values)
+
+    # Camadas com mesmo esquema e tamanho em um GDB diferente: compara o hash do conteúdo
+    to_verify = [dict(task, hash_only=True) for task in tasks if status[task['table_name']] == 'verify']
+    if to_verify:
+        print(f"🔎 Verificando o conteúdo de {len({task['table_name'] for task in to_verify})} tabela(s)...")
+
+        def verified(layer):
+            entry = manifest[layer['table_name']]
+            if layer['content_hash'] != entry['content_hash']:
+                status[layer['table_name']] = 'convert'
+                return
+            status[layer['table_name']] = 'skip'
+            entry['fingerprint'] = layer['fingerprint']
+            save_manifest(manifest)
+
+        run_tasks(to_verify, verified)
+
+    for table_name, table_status in status.items():
+        if table_status == 'skip':
+            print(f"⏭️ Tabela '{table_name}' sem alterações desde a última conversão. Pulando...")
+            for column, values in manifest[table_name].get('refs', {}).items():
+                refs[(table_name, column)] = set(values)
+
+    to_convert = [task for task in tasks if status[task['table_name']] == 'convert']
+    if to_convert:
+        print(f"🔄 Convertendo {len({task['table_name'] for task in to_convert})} tabelas em {len(to_convert)} partes com {workers} processo(s)...")
+        run_tasks(to_convert, record)
+
+def main():
+    print(f"🚀 Iniciando o processo de conversão das tabelas para {output_format.upper()}...")
     # Lista camadas disponíveis
     layers = fiona.listlayers(gdb_path)
     print("✅ Camadas disponíveis carregadas com sucesso.")
     print("Camadas encontradas:", layers)
-    
-    for i, table_name in enumerate(tables, start=1):
-        print(f"🔄 [{i}/{len(tables)}] Iniciando conversão da tabela: {table_name}")
-        
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    table_names = []
+    for table_name in tables:
         if table_name not in layers:
             print(f"⚠️ A camada '{table_name}' não foi encontrada. Pulando...")
             continue
-        
-        output_csv = os.path.join(output_dir, f"{table_name}.csv")
-        
-        print(f"📊 Extraindo dados da tabela '{table_name}'...")
-        # Abre a camada corretamente
+        table_names.append(table_name)
+
+    if scope_active():
+        print(f"🎯 Escopo: {len(escopo_alvo)} transformador(es), {len(escopo_ctmt)} alimentador(es)")
+
+    # Camadas filtradas pelos alimentadores dos transformadores rodam depois de UNTRMT, e as
+    # filtradas por referência (condutores, curvas...) depois das tabelas de origem
+    feeder_tables = []
+    for table_name in table_names:
         with fiona.open(gdb_path, layer=table_name) as src:
-            fieldnames = list(src.schema['properties'].keys())
-            
-            if src.schema['geometry']:
-                fieldnames.append('geometry')
-            
-            os.makedirs(os.path.dirname(output_csv), exist_ok=True)
-            
-            # Armazena os dados em uma lista de dicionários com barra de progresso
-            data = []
-            total_features = len(src)
-            with tqdm(total=total_features, desc=f"Convertendo {table_name}", unit="registro", ncols=100) as pbar:
-                for feature in src:
-                    row = feature['properties']
-                    if 'geometry' in fieldnames:
-                        row['geometry'] = feature['geometry']
-                    data.append(row)
-                    pbar.update(1)
-            
-            print(f"✅ Dados da tabela '{table_name}' extraídos com sucesso.")
-            
-            # Converte para DataFrame para melhor organização
-            df = pd.DataFrame(data)
-            
-            print(f"💾 Iniciando exportação para CSV: {output_csv}...")
-            # Escrita manual com barra de progresso
-            with open(output_csv, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames, delimiter=';')
-                writer.writeheader()
-                
-                for _, row in tqdm(df.iterrows(), total=len(df), desc=f"Escrevendo CSV {table_name}", unit="linha", ncols=100):
-                    writer.writerow(row.to_dict())
-            
-            print(f"✅ Tabela '{table_name}' convertida com sucesso para: {output_csv}")
-    
-    print("🎯 Processo de conversão concluído com sucesso!")
-
-except KeyboardInterrupt:
-    print("❗ Operação interrompida manualmente pelo usuário.")
-
-except Exception as e:
-    print(f"❌ Erro ao converter: {e}")
+            if feeder_scoped(table_name, src.schema['properties']):
+                feeder_tables.append(table_name)
+    dependents = [t for t in table_names if scope_active() and t in SCOPE_DEPENDENCIES]
+    phases = [[t for t in table_names if t not in dependents and t not in feeder_tables], feeder_tables, dependents]
+
+    start_time = time.time()
+    manifest = load_manifest()
+    refs = {}
+    for phase_tables in phases:
+        if phase_tables:
+            convert_tables(phase_tables, manifest, refs)
+
+    print(f"🎯 Processo de conversão concluído com sucesso em {time.time() - start_time:.1f} s!")
+
+if __name__ == "__main__":
+    try:
+        main()
+
+    except KeyboardInterrupt:
+        print("❗ Operação interrompida manualmente pelo usuário.")
+
+    except Exception as e:
+        print(f"❌ Erro ao converter: {e}")
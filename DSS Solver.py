@@ -1,13 +1,35 @@
 import os
 import sys
 import time
+import hashlib
 import traceback
 from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
 import py_dss_interface
+from ScenarioCatalog import ScenarioCatalog, file_hash, GENERATED, SOLVING, SOLVED, FAILED
 
 # Configurações
 BASE_PATH = r"C:\DSSFiles3"
 LOG_FILE = os.path.join(BASE_PATH, "dss_solver_progress.log")
+CATALOG_PATH = os.path.join(BASE_PATH, "scenarios.sqlite")  # Catálogo gerado pelo CenarioWriter
+
+# Comandos do arquivo ignorados no modo headless (resultados lidos direto da API)
+HEADLESS_SKIPPED_COMMANDS = ('show', 'export', 'plot')
+
+# Elementos que mudam de um cenário para outro (modo incremental: o restante do arquivo
+# é compilado uma única vez por processo e esses elementos são criados, alterados,
+# habilitados ou desabilitados a cada cenário)
+INCREMENTAL_PREFIXES = ('load.recharger_', 'generator.pv_')
+
+# Comandos que devolvem a solução ao estado de um circuito recém-compilado
+INCREMENTAL_RESET_COMMANDS = ("Set mode=snapshot", "Set controlmode=static", "Set time=(0,0)", "Reset Monitors")
+
+# Classes de elementos com estado entre os passos de tempo (controles, proteção e
+# armazenamento). Sem elas, cada passo da solução diária é uma solução snapshot
+# independente e os passos podem ser divididos entre atores (--split-steps)
+TIME_DEPENDENT_CLASSES = ('regcontrol', 'capcontrol', 'storagecontroller', 'invcontrol', 'expcontrol',
+                          'swtcontrol', 'upfccontrol', 'relay', 'recloser', 'fuse', 'storage')
 
 def log_message(message, log_file=None, print_to_console=True):
     """Registra mensagens no arquivo de log e na tela"""
@@ -32,19 +54,68 @@ def find_all_dss_files():
     
     return sorted(dss_files)  # Ordenar por caminho
 
-def solve_dss_file(dss_path, dss_instance=None):
-    """Resolve um arquivo DSS específico - versão ultra-mínima"""
+def scenario_from_path(dss_file):
+    """Extrai GD, EV e RS do nome da pasta do cenário (GD{g}--EV{e}--RS{s})"""
+    try:
+        scenario_folder = os.path.basename(os.path.dirname(os.path.dirname(dss_file)))
+        
+        # Parse GD, EV e RS do nome da pasta
+        parts = scenario_folder.split('--')
+        gd = parts[0].replace('GD', '')
+        ev = parts[1].replace('EV', '')
+        rs = parts[2].replace('RS', '')
+    except:
+        scenario_folder = "Desconhecido"
+        gd = "N/A"
+        ev = "N/A"
+        rs = "N/A"
+    return scenario_folder, gd, ev, rs
+
+def claim_dss_files(catalog, scenarios=None, recover=True):
+    """
+    Pega no catálogo os cenários gerados (e os que falharam na solução) para resolver.
+    Retorna a lista de (arquivo DSS, pasta do cenário, GD, EV, RS, cenário)
+    """
+    # Cenários que ficaram "resolvendo" em uma execução interrompida voltam para a fila
+    if recover:
+        recovered = catalog.recover([SOLVING])
+        if recovered:
+            log_message(f"{recovered} cenários interrompidos durante a solução voltaram para a fila.", LOG_FILE)
+    
+    tasks = []
+    for scenario in catalog.claim([GENERATED], SOLVING, scenarios, retry_stage='solve'):
+        row = catalog.get(scenario)
+        gd, ev, rs = scenario
+        scenario_folder = os.path.basename(os.path.dirname(os.path.dirname(row['dss_path'])))
+        tasks.append((row['dss_path'], scenario_folder, gd, ev, rs, scenario))
+    return tasks
+
+def solve_dss_file(dss_path, dss_instance=None, headless=False, circuit=None):
+    """
+    Resolve um arquivo DSS específico - versão ultra-mínima. Com circuit (IncrementalCircuit),
+    aproveita a rede já compilada e aplica apenas os elementos do cenário
+    """
     try:
         # Criar nova instância DSS se não fornecido
         if dss_instance is None:
-            dss = py_dss_interface.DSSDLL()
+            dss = py_dss_interface.DSS()
         else:
             dss = dss_instance
         
-        # Limpar e compilar - tão simples quanto possível
-        dss.text("clear")
-        dss.text(f"compile \"{dss_path}\"")
-        dss.text("solve")
+        if circuit is not None:
+            # Rede já compilada: aplicar os elementos do cenário e executar os comandos de solução
+            commands = circuit.load(dss_path)
+            for command in (headless_commands(commands) if headless else commands):
+                dss.text(command)
+        elif headless:
+            # Compilar o circuito e executar apenas os comandos de solução do arquivo
+            for command in headless_commands(compile_circuit(dss, dss_path)):
+                dss.text(command)
+        else:
+            # Limpar e compilar - tão simples quanto possível
+            dss.text("clear")
+            dss.text(f"compile \"{dss_path}\"")
+            dss.text("solve")
         
         return True, "Sucesso"
     
@@ -52,14 +123,525 @@ def solve_dss_file(dss_path, dss_instance=None):
         error_trace = traceback.format_exc()
         return False, f"Erro inesperado: {str(e)}\n{error_trace}"
 
-def main():
-    # Iniciar o arquivo de log
-    with open(LOG_FILE, 'w', encoding='utf-8') as f:
-        f.write(f"Iniciando solução em lote dos arquivos OpenDSS em {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+def extract_results(dss, elements=True):
+    """
+    Resultados do cenário lidos direto da API do OpenDSS (py_dss_interface 2.x), sem
+    Show/Export, como arrays NumPy:
+    - transformers: transformadores monitorados
+    - voltage_pu: tensão de fase no secundário em p.u. (transformador x passo x fase, NaN onde não há fase)
+    - loading: carregamento, potência aparente total / nominal (transformador x passo)
+    - node_names / node_voltage_pu: tensão (p.u.) de todos os nós ao final da solução
+    - total_power: potência da fonte (kW, kvar); losses: perdas totais (kW, kvar)
+    - element_names / element_powers / element_currents: potência (kW, kvar) e corrente
+      (A, graus) de cada terminal e condutor dos elementos ao final da solução (o que
+      Export Powers / Export Currents gravavam), concatenadas com element_offsets
+      indicando onde começa cada elemento (omitidas com elements=False)
+    """
+    voltages = {}
+    loadings = {}
+    
+    dss.monitors.first()
+    for _ in range(dss.monitors.count):
+        name = dss.monitors.name.lower()
+        element = dss.monitors.element
+        transformer = element.split('.', 1)[1]
+        dss.circuit.set_active_element(element)
+        num_phases = dss.cktelement.num_phases
+        
+        if name.endswith('_voltage'):
+            # Mode=0: canais V1, VAng1, V2, VAng2, ... (tensão fase-neutro em V)
+            bus = dss.cktelement.bus_names[1].split('.')[0]
+            dss.circuit.set_active_bus(bus)
+            base_voltage = dss.bus.kv_base * 1000
+            if base_voltage <= 0:
+                # Barra sem tensão base: usar a tensão nominal do secundário (fase-neutro)
+                dss.transformers.name = transformer
+                dss.transformers.wdg = 2
+                base_voltage = dss.transformers.kv * 1000 / (np.sqrt(3) if num_phases > 1 else 1)
+            if base_voltage <= 0:
+                raise ValueError(f"Transformador {transformer} sem tensão base no secundário")
+            channels = [dss.monitors.channel(2 * phase + 1) for phase in range(num_phases)]
+            voltages[transformer] = np.array(channels, dtype=float).T / base_voltage
+        elif name.endswith('_current'):
+            # Mode=1 com Ppolar=Yes (padrão): canais S1 (kVA), Ang1, S2, Ang2, ...
+            dss.transformers.name = transformer
+            rated_kva = dss.transformers.kva
+            s = np.array([dss.monitors.channel(2 * phase + 1) for phase in range(num_phases)], dtype=float)
+            if rated_kva:
+                loadings[transformer] = s.sum(axis=0) / rated_kva
+        dss.monitors.next()
+    
+    # Uma linha por transformador, com o mesmo número de passos e de fases
+    transformers = list(dict.fromkeys([*voltages, *loadings]))
+    steps = max([len(values) for values in [*voltages.values(), *loadings.values()]], default=0)
+    max_phases = max([values.shape[1] for values in voltages.values()], default=0)
+    voltage_pu = np.full((len(transformers), steps, max_phases), np.nan, dtype=np.float32)
+    loading = np.full((len(transformers), steps), np.nan, dtype=np.float32)
+    for row, transformer in enumerate(transformers):
+        if transformer in voltages:
+            values = voltages[transformer]
+            voltage_pu[row, :values.shape[0], :values.shape[1]] = values
+        if transformer in loadings:
+            values = loadings[transformer]
+            loading[row, :len(values)] = values
+    
+    # Potências e correntes dos elementos habilitados (número de valores variável por
+    # elemento). No modo incremental, os elementos de outros cenários ficam desabilitados
+    element_names = []
+    element_powers = []
+    element_currents = []
+    for element in (dss.circuit.elements_names if elements else []):
+        dss.circuit.set_active_element(element)
+        if not dss.cktelement.is_enabled:
+            continue
+        element_names.append(element)
+        element_powers.append(np.array(dss.cktelement.powers, dtype=np.float32))
+        element_currents.append(np.array(dss.cktelement.currents_mag_ang, dtype=np.float32))
+    sizes = [len(powers) for powers in element_powers]
+    empty = [np.empty(0, dtype=np.float32)]
+    
+    return {
+        'transformers': np.array(transformers, dtype=str),
+        'voltage_pu': voltage_pu,
+        'loading': loading,
+        'node_names': np.array(dss.circuit.nodes_names, dtype=str),
+        'node_voltage_pu': np.array(dss.circuit.buses_vmag_pu, dtype=np.float32),
+        'total_power': np.array(dss.circuit.total_power, dtype=float),
+        'losses': np.array(dss.circuit.losses, dtype=float) / 1000,
+        'element_names': np.array(element_names, dtype=str),
+        'element_powers': np.concatenate(element_powers or empty),
+        'element_currents': np.concatenate(element_currents or empty),
+        'element_offsets': np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64),
+    }
+
+def results_metrics(results):
+    """
+    Métricas do cenário: tensão máxima e mínima (p.u.) no secundário dos transformadores
+    e carregamento máximo (None se não houver valores)
+    """
+    voltage_pu = results['voltage_pu']
+    loading = results['loading']
+    has_voltage = bool(np.isfinite(voltage_pu).any())
+    has_loading = bool(np.isfinite(loading).any())
+    return {
+        'max_v_pu': float(np.nanmax(voltage_pu)) if has_voltage else None,
+        'min_v_pu': float(np.nanmin(voltage_pu)) if has_voltage else None,
+        'max_loading': float(np.nanmax(loading)) if has_loading else None,
+    }
+
+def extract_metrics(dss):
+    """Métricas do cenário a partir dos monitores dos transformadores, após a solução diária"""
+    return results_metrics(extract_results(dss, elements=False))
+
+def save_results(dss_file, results):
+    """Grava o registro compacto de resultados do cenário (.npz ao lado do arquivo DSS) e retorna o caminho"""
+    record_path = f"{os.path.splitext(dss_file)[0]}.npz"
+    temp_path = f"{record_path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        np.savez_compressed(f, **results)
+    os.replace(temp_path, record_path)
+    return record_path
+
+def collect_results(dss, dss_file, headless=False, results=None):
+    """
+    Campos do catálogo de um cenário resolvido: as métricas e, no modo headless (ou com os
+    resultados já lidos, como na divisão dos passos), o hash do registro compacto de
+    resultados, que substitui os relatórios e exportações do arquivo
+    """
+    if not headless and results is None:
+        return extract_metrics(dss)
+    if results is None:
+        results = extract_results(dss)
+    record_path = save_results(dss_file, results)
+    return {**results_metrics(results), 'result_hash': file_hash(record_path)}
+
+# Instância do OpenDSS de cada processo do pool (criada uma única vez em init_worker)
+_worker_dss = None
+
+def init_worker():
+    """Inicializa um processo do pool com a sua própria instância do OpenDSS"""
+    global _worker_dss
+    _worker_dss = py_dss_interface.DSS()
+
+def run_solve_task(dss_file, expected_hash=None, with_metrics=False, headless=False, incremental=False,
+                   split_steps=1, dss=None):
+    """
+    Resolve um arquivo na instância informada (ou na do processo do pool), conferindo o
+    hash registrado no catálogo, se informado, e extraindo as métricas se pedido (no modo
+    headless, gravando também o registro compacto de resultados). Com incremental, a rede
+    é compilada uma única vez por instância (ver IncrementalCircuit). Com split_steps > 1,
+    os passos da solução diária são divididos entre atores (ver solve_dss_file_split_steps).
+    Retorna (sucesso, mensagem, tempo de solução, campos do catálogo)
+    """
+    dss = dss if dss is not None else _worker_dss
+    results = None
+    start_solve_time = time.time()
+    if expected_hash is not None and (not os.path.exists(dss_file) or file_hash(dss_file) != expected_hash):
+        success, message = False, "Arquivo DSS diferente do registrado no catálogo (gere o cenário novamente)"
+    elif split_steps > 1:
+        success, message, results = solve_dss_file_split_steps(dss_file, dss, split_steps)
+    else:
+        circuit = get_incremental_circuit(dss) if incremental else None
+        success, message = solve_dss_file(dss_file, dss, headless, circuit)
+    solve_time = time.time() - start_solve_time
+    
+    fields = {}
+    if success and (with_metrics or headless or split_steps > 1):
+        try:
+            fields = collect_results(dss, dss_file, headless, results)
+        except Exception as e:
+            # Sem o registro de resultados, o cenário headless não tem saída nenhuma
+            success = success and not headless
+            message = f"Não foi possível extrair os resultados: {str(e)}"
+    return success, message, solve_time, fields
+
+def split_solution_commands(dss_path):
+    """
+    Divide o arquivo DSS em circuito (texto até o primeiro Solve, incluindo os monitores)
+    e lista dos comandos de solução a partir dele (Set, Solve, Show, Export, Plot...)
+    """
+    with open(dss_path) as f:
+        return split_solution_lines(f.read().splitlines())
+
+def split_solution_lines(lines):
+    """Divide as linhas de um arquivo DSS em circuito (até o primeiro Solve) e comandos de solução"""
+    for index, line in enumerate(lines):
+        if line.strip().lower().split(' ')[0] == 'solve':
+            break
+    else:
+        index = len(lines)
+    circuit = "\n".join(lines[:index]) + "\n"
+    commands = [line.strip() for line in lines[index:] if line.strip() and not line.strip().startswith('!')]
+    return circuit, commands
+
+def write_circuit_file(dss_file, circuit):
+    """
+    Grava o circuito em um arquivo temporário na mesma pasta do arquivo DSS (o Redirect
+    para o arquivo base é relativo a ela) e retorna o caminho
+    """
+    circuit_path = f"{dss_file}.circuit"
+    with open(circuit_path, 'w') as f:
+        f.write(circuit)
+    return circuit_path
+
+def compile_circuit(dss, dss_file):
+    """Compila apenas o circuito do arquivo DSS e retorna os comandos de solução"""
+    circuit, commands = split_solution_commands(dss_file)
+    circuit_path = write_circuit_file(dss_file, circuit)
+    try:
+        dss.text(f"compile \"{circuit_path}\"")
+    finally:
+        os.remove(circuit_path)
+    return commands
+
+def split_scenario_elements(dss_path):
+    """
+    Separa do arquivo DSS os elementos do cenário (ver INCREMENTAL_PREFIXES), retornando as
+    demais linhas de comando (sem comentários) e {elemento: definição em um único comando}
+    """
+    base_lines = []
+    elements = {}
+    element = None
+    with open(dss_path) as f:
+        for line in f.read().splitlines():
+            line = line.strip()
+            if not line or line.startswith('!'):
+                continue
+            parts = line.split(' ', 2)
+            if parts[0].lower() == 'new' and len(parts) > 1 and parts[1].lower().startswith(INCREMENTAL_PREFIXES):
+                element = parts[1]
+                elements[element] = line
+            elif line.startswith('~') and element is not None:
+                elements[element] += " " + line[1:].strip()
+            else:
+                element = None
+                base_lines.append(line)
+    return base_lines, elements
+
+class IncrementalCircuit:
+    """
+    Rede base compilada uma única vez em uma instância do OpenDSS. A cada cenário, apenas
+    os carregadores de EV (Recharger_) e os geradores fotovoltaicos (PV_) são criados,
+    alterados, habilitados ou desabilitados, e os monitores e a solução são reiniciados.
+    A rede é compilada novamente apenas quando o restante do arquivo muda
+    """
+    def __init__(self, dss):
+        self.dss = dss
+        self.base_key = None
+        self.elements = {}    # Elementos já criados na instância ({elemento: definição})
+        self.enabled = set()  # Elementos habilitados (os do último cenário)
+
+    def load(self, dss_path):
+        """Deixa na instância o circuito do arquivo e retorna os seus comandos de solução"""
+        try:
+            base_lines, elements = split_scenario_elements(dss_path)
+            circuit, commands = split_solution_lines(base_lines)
+            base_key = hashlib.sha1(circuit.encode()).hexdigest()
+            if base_key != self.base_key:
+                self.base_key = None
+                circuit_path = write_circuit_file(dss_path, circuit)
+                try:
+                    self.dss.text(f"compile \"{circuit_path}\"")
+                finally:
+                    os.remove(circuit_path)
+                self.base_key = base_key
+                self.elements = {}
+                self.enabled = set()
+
+            # Criar os elementos novos, atualizar os que mudaram e habilitar/desabilitar os demais
+            for element, definition in elements.items():
+                current = self.elements.get(element)
+                if current is None:
+                    self.dss.text(definition)
+                else:
+                    if current != definition:
+                        self.dss.text("Edit " + definition.split(' ', 1)[1])
+                    if element not in self.enabled:
+                        self.dss.text(f"Enable {element}")
+            for element in self.enabled - set(elements):
+                self.dss.text(f"Disable {element}")
+            self.elements.update(elements)
+            self.enabled = set(elements)
+
+            # Reiniciar monitores e solução; exportações vão para a pasta do cenário
+            for command in INCREMENTAL_RESET_COMMANDS:
+                self.dss.text(command)
+            self.dss.text(f"set datapath=\"{os.path.dirname(dss_path)}\"")
+        except Exception:
+            # Estado da instância incerto: compilar a rede novamente no próximo cenário
+            self.base_key = None
+            raise
+        return commands
+
+# Circuito incremental de cada instância do OpenDSS do processo
+_incremental_circuits = {}
+
+def get_incremental_circuit(dss):
+    """Circuito incremental associado à instância do OpenDSS (criado na primeira chamada)"""
+    if id(dss) not in _incremental_circuits:
+        _incremental_circuits[id(dss)] = IncrementalCircuit(dss)
+    return _incremental_circuits[id(dss)]
+
+def headless_commands(commands):
+    """Comandos de solução sem relatórios, exportações e gráficos"""
+    return [command for command in commands if command.split(' ')[0].lower() not in HEADLESS_SKIPPED_COMMANDS]
+
+def is_control_free(dss):
+    """Verdadeiro se o circuito do ator ativo não tem elementos de TIME_DEPENDENT_CLASSES"""
+    return not any(name.split('.', 1)[0].lower() in TIME_DEPENDENT_CLASSES for name in dss.circuit.elements_names)
+
+def stitch_results(parts):
+    """
+    Junta, na ordem dos passos, os resultados lidos de cada ator (ver extract_results).
+    Tensões e carregamentos são concatenados no tempo; os valores ao final da solução
+    (tensões dos nós, potência, perdas e elementos) vêm do último ator
+    """
+    for part in parts[1:]:
+        if not np.array_equal(part['transformers'], parts[0]['transformers']):
+            raise ValueError("Monitores diferentes entre os atores")
+    return {
+        **parts[-1],
+        'voltage_pu': np.concatenate([part['voltage_pu'] for part in parts], axis=1),
+        'loading': np.concatenate([part['loading'] for part in parts], axis=1),
+    }
+
+def solve_dss_file_split_steps(dss_path, dss, actors):
+    """
+    Resolve um único cenário dividindo os passos da solução diária entre atores do OpenDSS.
+    O ator 1 executa as soluções iniciais (snapshot) e o primeiro trecho do dia; os demais
+    compilam o mesmo circuito e começam cada um no seu passo (Set time). Os monitores de
+    todos os atores são juntados na ordem dos passos. Circuitos com controles
+    (TIME_DEPENDENT_CLASSES) são resolvidos em sequência no ator 1.
+    Retorna (sucesso, mensagem, resultados como em extract_results)
+    """
+    circuit_path = None
+    try:
+        circuit, commands = split_solution_commands(dss_path)
+        commands = headless_commands(commands)
+        solves = [index for index, command in enumerate(commands) if command.split(' ')[0].lower() == 'solve']
+        if not solves:
+            raise ValueError("Arquivo sem comando Solve")
+        setup = commands[:solves[-1]]
+        options = commands[solves[-1]].partition(' ')[2]
+        
+        # Ator 1: circuito, soluções iniciais e ajustes da solução diária
+        dss.text("ClearAll")
+        dss.text("set Parallel=No")
+        activate_actor(dss, 1)
+        circuit_path = write_circuit_file(dss_path, circuit)
+        dss.text(f"compile \"{circuit_path}\"")
+        for command in setup:
+            dss.text(command)
+        if options:
+            dss.text(f"set {options}")
+        
+        if not is_control_free(dss):
+            # Os passos dependem dos anteriores: resolver o dia inteiro em sequência
+            dss.text("Solve")
+            return True, "Sucesso (circuito com controles; passos resolvidos em sequência)", extract_results(dss)
+        
+        number = dss.solution.number
+        step_size = dss.solution.step_size
+        # O OpenDSS não cria mais atores do que CPUs
+        chunks = np.array_split(np.arange(number), max(1, min(actors, dss.parallel.num_cpus, number)))
+        
+        # Demais atores: mesmo circuito e ajustes, sem as soluções iniciais
+        for actor in range(2, len(chunks) + 1):
+            activate_actor(dss, actor, create=True)
+            dss.text(f"compile \"{circuit_path}\"")
+            for command in setup:
+                if command.split(' ')[0].lower() != 'solve':
+                    dss.text(command)
+            if options:
+                dss.text(f"set {options}")
+            dss.text("Reset Monitors")
+        
+        # Cada ator resolve o seu trecho de passos, começando no seu horário
+        for actor, chunk in enumerate(chunks, 1):
+            start_seconds = chunk[0] * step_size
+            activate_actor(dss, actor)
+            dss.text(f"set number={len(chunk)}")
+            dss.text(f"set time=({int(start_seconds // 3600)},{start_seconds % 3600:g})")
+        dss.text("set Parallel=Yes")
+        dss.text("SolveAll")
+        dss.text("Wait")
+        dss.text("set Parallel=No")
+        
+        parts = []
+        for actor in range(1, len(chunks) + 1):
+            activate_actor(dss, actor)
+            # Os valores ao final da solução (incluindo os elementos) vêm apenas do último ator
+            parts.append(extract_results(dss, elements=actor == len(chunks)))
+        return True, "Sucesso", stitch_results(parts)
+    
+    except Exception as e:
+        error_trace = traceback.format_exc()
+        return False, f"Erro inesperado: {str(e)}\n{error_trace}", None
+    finally:
+        if circuit_path is not None:
+            os.remove(circuit_path)
+
+def activate_actor(dss, actor, create=False):
+    """
+    Ativa o ator informado (criando-o antes com NewActor, se pedido) e confere que a
+    instância o aceitou: sem CPUs livres ou com um ator inexistente, o OpenDSS devolve o
+    erro como texto em vez de gerar uma exceção, e o ator ativo continua o anterior
+    """
+    reply = dss.text("NewActor") if create else ""
+    reply = dss.text(f"set ActiveActor={actor}") or reply
+    if dss.parallel.active_actor != actor:
+        raise RuntimeError(f"Ator {actor} indisponível no OpenDSS: {reply}")
+
+def solve_actor_batch(dss, tasks, headless=False):
+    """
+    Resolve um lote de arquivos com os atores do OpenDSS (um circuito por ator, na mesma
+    instância): compila cada cenário no seu ator e executa os comandos de solução em todos
+    os atores, com cada Solve virando SolveAll + Wait em modo paralelo.
+    tasks: lista de (arquivo DSS, hash esperado ou None, extrair métricas).
+    Retorna, na mesma ordem, (sucesso, mensagem, tempo de solução, campos do catálogo)
+    """
+    results = [None] * len(tasks)
+    actors = []  # (índice da tarefa, pasta do arquivo), um por ator a partir do ator 1
+    created = 1  # Atores existentes na instância (ClearAll deixa apenas o ator 1)
+    solution_commands = None
+    start_batch_time = time.time()
+    
+    # Compilar cada cenário no seu ator (sem solução paralela durante a compilação)
+    dss.text("ClearAll")
+    dss.text("set Parallel=No")
+    dss.text("set ActiveActor=1")
+    for index, (dss_file, expected_hash, with_metrics) in enumerate(tasks):
+        if expected_hash is not None and (not os.path.exists(dss_file) or file_hash(dss_file) != expected_hash):
+            results[index] = (False, "Arquivo DSS diferente do registrado no catálogo (gere o cenário novamente)", 0.0, {})
+            continue
+        
+        circuit_path = None
+        try:
+            circuit, commands = split_solution_commands(dss_file)
+            if headless:
+                commands = headless_commands(commands)
+            if solution_commands is None:
+                solution_commands = commands
+            elif commands != solution_commands:
+                raise ValueError("Comandos de solução diferentes dos demais arquivos do lote")
+            circuit_path = write_circuit_file(dss_file, circuit)
+            # Os arquivos começam com Clear, então um ator com falha na compilação é reaproveitado
+            if len(actors) == created:
+                activate_actor(dss, created + 1, create=True)
+                created += 1
+            else:
+                activate_actor(dss, created)
+            dss.text(f"compile \"{circuit_path}\"")
+            actors.append((index, os.path.dirname(dss_file)))
+        except Exception as e:
+            error_trace = traceback.format_exc()
+            results[index] = (False, f"Erro inesperado: {str(e)}\n{error_trace}", 0.0, {})
+        finally:
+            if circuit_path is not None:
+                os.remove(circuit_path)
+    
+    if not actors:
+        return results
+    if created > len(actors):
+        # Limpar o último ator, que ficou com um circuito que falhou na compilação
+        activate_actor(dss, created)
+        dss.text("Clear")
     
-    # Encontrar todos os arquivos DSS
-    log_message("Buscando arquivos DSS...", LOG_FILE)
-    dss_files = find_all_dss_files()
+    try:
+        # Executar os comandos de solução em todos os atores; os Solve rodam em paralelo
+        dss.text("set Parallel=Yes")
+        for command in solution_commands:
+            name, _, options = command.partition(' ')
+            if name.lower() == 'solve':
+                if options:
+                    for actor in range(1, len(actors) + 1):
+                        activate_actor(dss, actor)
+                        dss.text(f"set {options}")
+                dss.text("SolveAll")
+                dss.text("Wait")
+            else:
+                for actor, (_, dss_folder) in enumerate(actors, 1):
+                    activate_actor(dss, actor)
+                    dss.text(f"set datapath=\"{dss_folder}\"")
+                    dss.text(command)
+        dss.text("set Parallel=No")
+        
+        # Coletar as métricas de cada ator (tempo do lote dividido entre os cenários)
+        solve_time = (time.time() - start_batch_time) / len(actors)
+        for actor, (index, _) in enumerate(actors, 1):
+            dss_file, _, with_metrics = tasks[index]
+            fields = {}
+            success, message = True, "Sucesso"
+            if with_metrics or headless:
+                try:
+                    activate_actor(dss, actor)
+                    fields = collect_results(dss, dss_file, headless)
+                except Exception as e:
+                    success = not headless
+                    message = f"Não foi possível extrair os resultados: {str(e)}"
+            results[index] = (success, message, solve_time, fields)
+    except Exception as e:
+        error_trace = traceback.format_exc()
+        solve_time = (time.time() - start_batch_time) / len(actors)
+        for index, _ in actors:
+            results[index] = (False, f"Erro inesperado no lote de atores: {str(e)}\n{error_trace}", solve_time, {})
+    
+    return results
+
+def solve_tasks(dss_files, catalog=None, workers=1, initializer=None, actors=1, headless=False, incremental=False,
+                split_steps=1):
+    """
+    Resolve a lista de (arquivo DSS, pasta do cenário, GD, EV, RS, cenário), em sequência
+    (workers=1) ou em um pool de processos com uma instância do OpenDSS cada, registrando
+    o progresso e, se houver catálogo, o estado, os tempos e as métricas de cada cenário.
+    initializer substitui init_worker quando este módulo é carregado por outro script
+    (o processo do pool precisa carregar o módulo antes de receber as tarefas).
+    Com actors > 1, resolve lotes de arquivos nos atores paralelos do OpenDSS (ver solve_actor_batch).
+    Com headless, ignora Show/Export/Plot e grava um registro compacto por cenário (ver extract_results).
+    Com incremental (em sequência ou no pool), cada instância compila a rede uma única vez.
+    Com split_steps > 1 (em sequência ou no pool), cada cenário tem os passos da solução
+    diária divididos entre split_steps atores (ver solve_dss_file_split_steps)
+    """
     total_files = len(dss_files)
     log_message(f"Encontrados {total_files} arquivos DSS para processar.", LOG_FILE)
     
@@ -73,13 +655,8 @@ def main():
     failed = 0
     start_time = time.time()
     
-    # Criar uma única instância do DSS para reutilização
-    dss = py_dss_interface.DSSDLL()
-    log_message("Instância do OpenDSS inicializada.", LOG_FILE)
-    
-    # Processar cada arquivo
-    for dss_file in dss_files:
-        processed += 1
+    def log_progress(task):
+        dss_file, scenario_folder, gd, ev, rs, scenario = task
         
         # Calcular estatísticas de progresso
         elapsed_time = time.time() - start_time
@@ -88,22 +665,7 @@ def main():
         estimated_remaining_time = avg_time_per_file * remaining_files
         eta = datetime.now() + timedelta(seconds=estimated_remaining_time)
         
-        # Extrair informações do cenário do caminho do arquivo
-        try:
-            scenario_folder = os.path.basename(os.path.dirname(os.path.dirname(dss_file)))
-            file_name = os.path.basename(dss_file)
-            
-            # Parse GD, EV e RS do nome da pasta
-            parts = scenario_folder.split('--')
-            gd = parts[0].replace('GD', '')
-            ev = parts[1].replace('EV', '')
-            rs = parts[2].replace('RS', '')
-        except:
-            scenario_folder = "Desconhecido"
-            file_name = os.path.basename(dss_file)
-            gd = "N/A"
-            ev = "N/A"
-            rs = "N/A"
+        file_name = os.path.basename(dss_file)
         
         # Log de progresso
         progress_pct = (processed / total_files) * 100
@@ -114,16 +676,27 @@ def main():
             log_message(f"Tempo médio por arquivo: {avg_time_per_file:.2f} segundos", LOG_FILE)
             log_message(f"Tempo estimado restante: {timedelta(seconds=int(estimated_remaining_time))}", LOG_FILE)
             log_message(f"ETA: {eta.strftime('%Y-%m-%d %H:%M:%S')}", LOG_FILE)
+    
+    def record(task, success, message, solve_time, fields):
+        nonlocal successful, failed
+        dss_file, scenario = task[0], task[5]
+        file_name = os.path.basename(dss_file)
         
-        # Resolver o arquivo
-        start_solve_time = time.time()
-        success, message = solve_dss_file(dss_file, dss)
-        solve_time = time.time() - start_solve_time
+        # Atualizar o catálogo (com as métricas usadas pela geração adaptativa)
+        if catalog is not None:
+            if success:
+                catalog.mark(scenario, SOLVED, solve_seconds=solve_time, failed_stage=None, error=None, **fields)
+            else:
+                released = catalog.mark(scenario, FAILED, solve_seconds=solve_time, failed_stage='solve', error=message)
+                if released:
+                    log_message(f"{released} alias de {file_name} voltaram a pendentes no catálogo (serão gerados novamente).", LOG_FILE)
         
         # Registrar resultado
         if success:
             successful += 1
             log_message(f"✓ Sucesso: {file_name} resolvido em {solve_time:.2f} segundos", LOG_FILE)
+            if message != "Sucesso":
+                log_message(f"{file_name}: {message}", LOG_FILE)
         else:
             failed += 1
             log_message(f"✗ Falha: {file_name} - {message}", LOG_FILE)
@@ -134,6 +707,65 @@ def main():
         # Linha em branco para separar os registros
         log_message("", LOG_FILE)
     
+    if split_steps > 1:
+        log_message(f"Passos da solução diária divididos entre {split_steps} atores por cenário (grava apenas o registro compacto).", LOG_FILE)
+        if incremental:
+            log_message("O modo incremental não se aplica à divisão dos passos; cada cenário é compilado.", LOG_FILE)
+            incremental = False
+        if actors > 1:
+            log_message("Os lotes de atores (--actors) não se aplicam à divisão dos passos.", LOG_FILE)
+    elif workers > 1 and actors > 1:
+        log_message("Os lotes de atores (--actors) não se aplicam ao pool de processos (--workers); "
+                    "cada processo resolve um arquivo por vez.", LOG_FILE)
+    
+    def task_arguments(task):
+        expected_hash = catalog.get(task[5])['dss_hash'] if catalog is not None else None
+        return task[0], expected_hash, catalog is not None
+    
+    if workers > 1:
+        # Cada processo tem a sua instância do OpenDSS e recebe arquivos conforme termina os anteriores
+        log_message(f"Resolvendo em paralelo com {workers} processos (uma instância do OpenDSS cada).", LOG_FILE)
+        with ProcessPoolExecutor(max_workers=workers, initializer=initializer or init_worker) as executor:
+            futures = {executor.submit(run_solve_task, *task_arguments(task), headless, incremental, split_steps): task for task in dss_files}
+            for future in as_completed(futures):
+                task = futures[future]
+                processed += 1
+                log_progress(task)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = (False, f"Erro no processo de solução: {str(e)}", 0.0, {})
+                record(task, *result)
+    elif actors > 1 and split_steps == 1:
+        # Uma única instância do OpenDSS, com um ator (circuito) por cenário do lote
+        dss = py_dss_interface.DSS()
+        if actors > dss.parallel.num_cpus:
+            # O OpenDSS não cria mais atores do que CPUs
+            log_message(f"O OpenDSS tem {dss.parallel.num_cpus} CPUs; lotes limitados a esse número de atores.", LOG_FILE)
+            actors = max(1, dss.parallel.num_cpus)
+        log_message(f"Resolvendo em lotes de {actors} atores paralelos do OpenDSS.", LOG_FILE)
+        if incremental:
+            log_message("O modo incremental não se aplica aos atores; cada lote compila os seus arquivos.", LOG_FILE)
+        
+        for batch_start in range(0, total_files, actors):
+            batch = dss_files[batch_start:batch_start + actors]
+            results = solve_actor_batch(dss, [task_arguments(task) for task in batch], headless)
+            for task, result in zip(batch, results):
+                processed += 1
+                log_progress(task)
+                record(task, *result)
+    else:
+        # Criar uma única instância do DSS para reutilização
+        dss = py_dss_interface.DSS()
+        log_message("Instância do OpenDSS inicializada.", LOG_FILE)
+        
+        # Processar cada arquivo
+        for task in dss_files:
+            processed += 1
+            log_progress(task)
+            record(task, *run_solve_task(*task_arguments(task), headless=headless, incremental=incremental,
+                                           split_steps=split_steps, dss=dss))
+    
     # Estatísticas finais
     total_time = time.time() - start_time
     log_message("==== Resumo Final ====", LOG_FILE)
@@ -144,9 +776,75 @@ def main():
     log_message(f"Tempo total de execução: {timedelta(seconds=int(total_time))}", LOG_FILE)
     log_message(f"Tempo médio por arquivo: {total_time/processed if processed > 0 else 0:.2f} segundos", LOG_FILE)
 
+def solve_catalog_scenarios(scenarios=None, catalog_path=None, workers=1, initializer=None, actors=1, headless=False,
+                            incremental=False, split_steps=1):
+    """Resolve os cenários gerados do catálogo (opcionalmente apenas os da lista scenarios)"""
+    catalog = ScenarioCatalog(catalog_path or CATALOG_PATH)
+    try:
+        solve_tasks(claim_dss_files(catalog, scenarios, recover=False), catalog, workers, initializer, actors, headless, incremental, split_steps)
+    finally:
+        catalog.close()
+
+def main(workers=1, actors=1, headless=False, incremental=False, split_steps=1):
+    # Iniciar o arquivo de log
+    with open(LOG_FILE, 'w', encoding='utf-8') as f:
+        f.write(f"Iniciando solução em lote dos arquivos OpenDSS em {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    
+    # Pegar os cenários no catálogo ou, se não houver catálogo, encontrar todos os arquivos DSS
+    catalog = None
+    if os.path.exists(CATALOG_PATH):
+        log_message(f"Buscando cenários no catálogo {CATALOG_PATH}...", LOG_FILE)
+        catalog = ScenarioCatalog(CATALOG_PATH)
+        dss_files = claim_dss_files(catalog)
+    else:
+        log_message("Buscando arquivos DSS...", LOG_FILE)
+        dss_files = [(dss_file, *scenario_from_path(dss_file), None) for dss_file in find_all_dss_files()]
+    
+    solve_tasks(dss_files, catalog, workers, actors=actors, headless=headless, incremental=incremental,
+                split_steps=split_steps)
+    
+    if catalog is not None:
+        catalog.close()
+
 if __name__ == "__main__":
+    # Processar --workers (número de processos, cada um com a sua instância do OpenDSS)
+    workers = 1
+    if "--workers" in sys.argv:
+        idx = sys.argv.index("--workers")
+        if idx + 1 < len(sys.argv):
+            try:
+                workers = max(1, int(sys.argv[idx + 1]))
+            except ValueError:
+                pass
+    
+    # Processar --actors (cenários resolvidos em paralelo nos atores de uma única instância)
+    actors = 1
+    if "--actors" in sys.argv:
+        idx = sys.argv.index("--actors")
+        if idx + 1 < len(sys.argv):
+            try:
+                actors = max(1, int(sys.argv[idx + 1]))
+            except ValueError:
+                pass
+    
+    # Processar --headless (sem Show/Export/Plot; resultados lidos direto da API)
+    headless = "--headless" in sys.argv
+    
+    # Processar --incremental (rede compilada uma única vez por processo)
+    incremental = "--incremental" in sys.argv
+    
+    # Processar --split-steps (passos da solução diária de cada cenário divididos entre atores)
+    split_steps = 1
+    if "--split-steps" in sys.argv:
+        idx = sys.argv.index("--split-steps")
+        if idx + 1 < len(sys.argv):
+            try:
+                split_steps = max(1, int(sys.argv[idx + 1]))
+            except ValueError:
+                pass
+    
     try:
-        main()
+        main(workers, actors, headless, incremental, split_steps)
     except Exception as e:
         error_trace = traceback.format_exc()
         log_message(f"Erro fatal no script: {str(e)}\n{error_trace}", LOG_FILE)
\ No newline at end of file
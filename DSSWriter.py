@@ -1,6 +1,11 @@
 import os
+import hashlib
+import io
+from collections import deque
 import pandas as pd
 import numpy as np
+import pyarrow.parquet as pq
+from BDGDSchema import column_types
 
 # Definição dos caminhos
 DICT_PATH = r'C:\Users\bruno\OneDrive\Área de Trabalho\TCC\PYTHON\CSV\dict'  # Caminho para os arquivos de dicionário
@@ -13,6 +18,17 @@ EVSpread = 0  # Porcentagem de cargas que sofrerão aumento para veículos elét
 GDSpread = 0  # Porcentagem de cargas que receberão geração distribuída
 random_seed = 1  # Semente Aleatória para Reprodução
 
+# Sorteio dos cenários: 'seedsequence' usa um numpy.random.Generator próprio para cada
+# cenário (mesmo resultado em série, em paralelo ou isolado); 'legacy' usa a semente
+# global do NumPy como nas versões anteriores
+RNG_MODE = 'seedsequence'
+RNG_STREAMS = {'EV': 0, 'GD': 1}  # Fluxos independentes para EV e GD
+
+# Escolha das UCs: 'independent' sorteia cada percentual separadamente; 'nested' usa uma
+# única permutação das UCs por semente e cada percentual pega o seu início (EV50 = EV25 +
+# novos carregadores, com as mesmas curvas), permitindo subir a penetração por incrementos
+PLACEMENT_MODE = 'independent'
+
 # Distribuição de curvas de carga
 CurvaRecharger1 = 33.3333  # %
 CurvaRecharger2 = 33.3334  # %
@@ -28,6 +44,21 @@ default_day_type = 'DU'
 medium_voltage_base = 13.8  # kV
 low_voltage_base = 0.22  # kV
 
+# Cache da topologia de baixa tensão corrigida (independente de EV/GD/semente)
+TOPOLOGY_CACHE_PATH = os.path.join(DSS_PATH, 'cache')
+use_topology_cache = True
+TOPOLOGY_CACHE_VERSION = 1  # Incrementar se check_and_fix_connectivity mudar
+
+# Rede base (curvas, transformadores, linhas e cargas existentes) escrita uma única vez
+# em BASE_INCLUDE_PATH e incluída por Redirect em cada cenário, que só traz os
+# carregadores de EV e os geradores fotovoltaicos. False = arquivo completo por cenário
+use_base_include = True
+BASE_INCLUDE_PATH = DSS_PATH  # Diretório compartilhado pelos arquivos base
+
+# Arquivos sem Show/Export/Plot: o DSS Solver (--headless) lê os monitores e as tensões
+# direto da API do OpenDSS e grava apenas um registro compacto por cenário
+use_headless_solution = False
+
 # Garantir que o diretório DSS existe
 os.makedirs(DSS_PATH, exist_ok=True)
 
@@ -39,10 +70,30 @@ escopo_alvo = [
  '34623374'
 ]
 
-# Função para carregar arquivos CSV
+# Função para aplicar os tipos declarados em BDGDSchema a uma tabela lida como texto
+def apply_schema(df, table_name):
+    for column, kind in column_types(table_name).items():
+        if column not in df.columns:
+            continue
+        if kind == 'float':
+            df[column] = pd.to_numeric(df[column].astype(str).str.replace(',', '.'), errors='coerce')
+        else:
+            df[column] = df[column].astype('category')
+    return df
+
+# Função para carregar arquivos CSV (ou a versão Parquet gerada pelo Converter, se existir)
 def load_csv(file_name):
     try:
-        df = pd.read_csv(os.path.join(CSV_PATH, file_name), sep=';', decimal='.', dtype=str)
+        table_name = os.path.splitext(file_name)[0]
+        parquet_path = os.path.join(CSV_PATH, table_name + '.parquet')
+        if os.path.exists(parquet_path):
+            # O Parquet já vem tipado pelo Converter; geometria (se houver) não é lida
+            columns = [c for c in pq.read_schema(parquet_path).names if c != 'geometry']
+            df = pd.read_parquet(parquet_path, columns=columns)
+        else:
+            df = pd.read_csv(os.path.join(CSV_PATH, file_name), sep=';', decimal='.', dtype=str,
+                             usecols=lambda c: c != 'geometry')
+            df = apply_schema(df, table_name)
         # Se o arquivo tem UNI_TR_MT, filtrar pelo escopo_alvo imediatamente
         if 'UNI_TR_MT' in df.columns:
             df = df[df['UNI_TR_MT'].isin(escopo_alvo)]
@@ -51,6 +102,16 @@ def load_csv(file_name):
         print(f"Erro ao carregar {file_name}: {e}")
         return pd.DataFrame()
 
+# Função para carregar as geometrias de uma tabela (arquivo auxiliar em WKB gerado pelo
+# Converter). Só deve ser usada por quem precisa de coordenadas; as demais leituras
+# não tocam nas geometrias. Com decode=True as geometrias são convertidas com shapely.
+def load_geometry(table_name, decode=False):
+    df = pd.read_parquet(os.path.join(CSV_PATH, f"{table_name}.geometry.parquet"))
+    if decode:
+        import shapely  # Dependência necessária apenas para decodificar as geometrias
+        df['geometry'] = shapely.from_wkb(df['geometry'].to_numpy())
+    return df
+
 # Função para carregar dicionários
 def load_dict(file_name):
     try:
@@ -74,54 +135,198 @@ def translate_code(df, column, dict_df, dict_key, dict_value):
     if column in df.columns:
         if dict_key in dict_df.columns and dict_value in dict_df.columns:
             mapping = dict_df.set_index(dict_key)[dict_value].to_dict()
-            df[column] = df[column].map(mapping).fillna(df[column])
+            values = df[column].astype(object)  # Códigos podem vir como categoria
+            df[column] = values.map(mapping).fillna(values)
     return df
 
-# Função para determinar o número de fases
-def determine_phases(fas_con):
-    if fas_con in ['ABCN', 'ABC']:
-        return 3
-    elif fas_con in ['ABN', 'AB']:
-        return 2
-    elif fas_con in ['AN', 'BN', 'A', 'B']:
-        return 1
-    else:
-        return 3  # Default to 3 phases if unknown
+# Número de fases por configuração (FAS_CON); valores desconhecidos são trifásicos
+PHASES_BY_FAS_CON = {'ABCN': 3, 'ABC': 3, 'ABN': 2, 'AB': 2, 'AN': 1, 'BN': 1, 'A': 1, 'B': 1}
+
+# Função para determinar o número de fases de uma coluna inteira
+def determine_phases_column(fas_con):
+    return fas_con.astype(object).map(PHASES_BY_FAS_CON).fillna(3).astype(int).to_numpy()
+
+# Função para converter uma coluna em float, trocando nulos pelo valor padrão.
+# Retorna os valores e o texto de cada um como o f-string escreveria
+# (float(valor) para os presentes, o padrão sem conversão para os nulos)
+def numeric_column(values, default):
+    numeric = values.astype(float).to_numpy()
+    missing = np.isnan(numeric)
+    text = np.where(missing, str(default), numeric.astype(str))
+    return np.where(missing, default, numeric), text
+
+# Função para formatar números com o formato fixo informado (ex.: '%.3f')
+def format_column(values, fmt):
+    return np.char.mod(fmt, np.asarray(values, dtype=float))
+
+# Função para escrever uma coluna float como o CSV sem esquema era lido:
+# valores inteiros sem ".0" (ex.: kW=10, XHL=4) e os demais como float
+def number_text(values):
+    return [str(int(value)) if value.is_integer() else str(value) for value in np.asarray(values, dtype=float).tolist()]
+
+# Função para montar a configuração de um cenário (valores não informados vêm dos parâmetros do módulo)
+def scenario_config(config=None, **overrides):
+    scenario = {
+        'EVSpread': EVSpread,
+        'GDSpread': GDSpread,
+        'random_seed': random_seed,
+        'rechargerload': rechargerload,
+        'DSS_PATH': DSS_PATH,
+    }
+    scenario.update(config or {})
+    scenario.update(overrides)
+    return scenario
+
+# Função para criar o gerador aleatório de um fluxo ('EV' ou 'GD') do cenário.
+# A SeedSequence depende só da semente, do fluxo e do percentual do próprio fluxo
+def scenario_rng(config, stream):
+    level = config['EVSpread'] if stream == 'EV' else config['GDSpread']
+    seed_sequence = np.random.SeedSequence(entropy=int(config['random_seed']),
+                                           spawn_key=(RNG_STREAMS[stream], int(level)))
+    return np.random.default_rng(seed_sequence)
+
+# Função para obter as curvas dos carregadores e a probabilidade de cada uma
+def charger_curve_distribution():
+    choices = ['CurvaRecharger1', 'CurvaRecharger2', 'CurvaRecharger3']
+    probabilities = [CurvaRecharger1 / 100, CurvaRecharger2 / 100, CurvaRecharger3 / 100]
+    return choices, probabilities
+
+# Função para obter a posição de cada UC na permutação de um fluxo no modo 'nested'.
+# A permutação (e o gerador, usado em seguida para as curvas) depende só da semente e do
+# fluxo, nunca do percentual: um percentual escolhe as UCs com posição menor que a quantidade
+def nested_placement(num_loads, seed, stream):
+    seed_sequence = np.random.SeedSequence(entropy=int(seed), spawn_key=(RNG_STREAMS[stream],))
+    rng = np.random.default_rng(seed_sequence)
+    rank = np.empty(num_loads, dtype=np.int64)
+    rank[rng.permutation(num_loads)] = np.arange(num_loads)
+    return rank, rng
+
+# Função para sortear, de uma vez, as UCs com EV e com GD de todas as sementes e percentuais
+# (modo 'nested'). Cada matriz tem uma linha por semente e uma coluna por UC:
+# - ev_level / gd_level: índice do menor percentual (em ev_levels / gd_levels) em que a UC
+#   recebe carregador / gerador, ou -1 se não recebe em nenhum
+# - ev_curve: índice da curva do carregador da UC (em charger_curve_distribution)
+def sample_placements(num_loads, seeds, ev_levels, gd_levels):
+    choices, probabilities = charger_curve_distribution()
+    ev_levels = np.sort(np.asarray(ev_levels))
+    gd_levels = np.sort(np.asarray(gd_levels))
+
+    ev_ranks = np.empty((len(seeds), num_loads), dtype=np.int64)
+    gd_ranks = np.empty((len(seeds), num_loads), dtype=np.int64)
+    ev_curve = np.empty((len(seeds), num_loads), dtype=np.int8)
+    for row, seed in enumerate(seeds):
+        ev_ranks[row], rng = nested_placement(num_loads, seed, 'EV')
+        ev_curve[row] = rng.choice(len(choices), size=num_loads, p=probabilities)
+        gd_ranks[row], _ = nested_placement(num_loads, seed, 'GD')
+
+    # Menor percentual cuja quantidade de UCs supera a posição da UC na permutação
+    def first_level(ranks, levels):
+        counts = np.array([int((level / 100) * num_loads) for level in levels])
+        level = np.searchsorted(counts, ranks, side='right')
+        return np.where(level < len(levels), level, -1).astype(np.int8)
+
+    return {
+        'seeds': np.asarray(seeds),
+        'ev_levels': ev_levels,
+        'gd_levels': gd_levels,
+        'ev_level': first_level(ev_ranks, ev_levels),
+        'ev_curve': ev_curve,
+        'gd_level': first_level(gd_ranks, gd_levels),
+    }
+
+# Função para obter as UCs com EV (e suas curvas) e com GD de um cenário a partir do sorteio
+# em lote; retorna None se a semente ou algum dos percentuais não foi sorteado
+def placement_selection(placements, config):
+    seeds = placements['seeds'].tolist()
+    ev_levels = placements['ev_levels'].tolist()
+    gd_levels = placements['gd_levels'].tolist()
+    if (config['random_seed'] not in seeds or config['EVSpread'] not in ev_levels
+            or config['GDSpread'] not in gd_levels):
+        return None
+
+    row = seeds.index(config['random_seed'])
+    ev_level = placements['ev_level'][row]
+    gd_level = placements['gd_level'][row]
+    ev_positions = np.flatnonzero((ev_level >= 0) & (ev_level <= ev_levels.index(config['EVSpread'])))
+    gd_positions = np.flatnonzero((gd_level >= 0) & (gd_level <= gd_levels.index(config['GDSpread'])))
+    return ev_positions, placements['ev_curve'][row, ev_positions], gd_positions
+
+# Função para calcular o hash do posicionamento de um cenário (ver ScenarioGenerator.select)
+def placement_fingerprint(selection, config):
+    ev_positions, ev_curves, pv_positions = selection
+    digest = hashlib.sha1(f"kW={config['rechargerload']}".encode())
+    for values, dtype in ((ev_positions, np.int64), (ev_curves, np.int8), (pv_positions, np.int64)):
+        values = np.ascontiguousarray(values, dtype=dtype)
+        digest.update(len(values).to_bytes(8, 'little'))
+        digest.update(values.tobytes())
+    return digest.hexdigest()
 
 # Função para aplicar aumento de carga para veículos elétricos
-def apply_load_increase(loads_df):
+def apply_load_increase(loads_df, config=None, selection=None):
+    config = scenario_config(config)
     num_loads = len(loads_df)
-    num_to_increase = int((EVSpread / 100) * num_loads)
-    np.random.seed(random_seed)  # Garantir que a semente aleatória seja aplicada
-    loads_to_increase = loads_df.sample(num_to_increase, random_state=random_seed).copy()
+    num_to_increase = int((config['EVSpread'] / 100) * num_loads)
+
+    # Curvas de carga dos carregadores baseadas na distribuição
+    choices, probabilities = charger_curve_distribution()
+
+    if selection is not None:
+        # UCs e curvas já sorteadas em lote (sample_placements)
+        positions, curves, _ = selection
+        loads_to_increase = loads_df.iloc[positions].copy()
+        loads_to_increase['TIP_CC'] = np.asarray(choices)[curves]
+    elif PLACEMENT_MODE == 'nested':
+        # UCs no início da permutação da semente; a curva de cada UC é sorteada para todas as UCs
+        rank, rng = nested_placement(num_loads, config['random_seed'], 'EV')
+        curves = rng.choice(len(choices), size=num_loads, p=probabilities)
+        positions = np.flatnonzero(rank < num_to_increase)
+        loads_to_increase = loads_df.iloc[positions].copy()
+        loads_to_increase['TIP_CC'] = np.asarray(choices)[curves[positions]]
+    else:
+        if RNG_MODE == 'legacy':
+            np.random.seed(config['random_seed'])  # Garantir que a semente aleatória seja aplicada
+            rng = np.random
+            random_state = config['random_seed']
+        else:
+            rng = random_state = scenario_rng(config, 'EV')
+        loads_to_increase = loads_df.sample(num_to_increase, random_state=random_state).copy()
 
-    # Definir curva de carga aleatória baseada na distribuição
-    choices = ['CurvaRecharger1', 'CurvaRecharger2', 'CurvaRecharger3']
-    probabilities = [CurvaRecharger1 / 100, CurvaRecharger2 / 100, CurvaRecharger3 / 100]
-    loads_to_increase['TIP_CC'] = np.random.choice(choices, size=len(loads_to_increase), p=probabilities)
+        # Definir curva de carga aleatória baseada na distribuição
+        loads_to_increase['TIP_CC'] = rng.choice(choices, size=len(loads_to_increase), p=probabilities)
 
     # Criar nova carga para as UCBTs selecionadas
     new_loads = loads_to_increase.copy()
-    new_loads['kW_increased'] = rechargerload
+    new_loads['kW_increased'] = config['rechargerload']
     new_loads['PAC'] = loads_to_increase['PAC']  # Mesmo barramento
     new_loads['FAS_CON'] = loads_to_increase['FAS_CON']
     new_loads['TEN_FORN'] = loads_to_increase['TEN_FORN']  # Adicionado para garantir a tensão correta
     
-    print(f"Adicionando {num_to_increase} carregadores de EV ({EVSpread}% das UCs)")
+    print(f"Adicionando {num_to_increase} carregadores de EV ({config['EVSpread']}% das UCs)")
     return new_loads
 
 # Função para aplicar geração distribuída fotovoltaica
-def apply_distributed_generation(loads_df):
+def apply_distributed_generation(loads_df, config=None, selection=None):
+    config = scenario_config(config)
     num_loads = len(loads_df)
-    num_to_add_gd = int((GDSpread / 100) * num_loads)
-    np.random.seed(random_seed)  # Garantir que a semente aleatória seja aplicada
-    loads_with_gd = loads_df.sample(num_to_add_gd, random_state=random_seed).copy()
+    num_to_add_gd = int((config['GDSpread'] / 100) * num_loads)
+    if selection is not None:
+        loads_with_gd = loads_df.iloc[selection[2]].copy()
+    elif PLACEMENT_MODE == 'nested':
+        rank, _ = nested_placement(num_loads, config['random_seed'], 'GD')
+        loads_with_gd = loads_df.iloc[np.flatnonzero(rank < num_to_add_gd)].copy()
+    else:
+        if RNG_MODE == 'legacy':
+            np.random.seed(config['random_seed'])  # Garantir que a semente aleatória seja aplicada
+            random_state = config['random_seed']
+        else:
+            random_state = scenario_rng(config, 'GD')
+        loads_with_gd = loads_df.sample(num_to_add_gd, random_state=random_state).copy()
     
     # Criar geração fotovoltaica para as UCBTs selecionadas
     loads_with_gd['kW_generation'] = pd.to_numeric(loads_with_gd['CAR_INST'], errors='coerce')
     loads_with_gd['TIP_CC_GD'] = 'CurvaGD'  # Usar a curva universal de geração fotovoltaica
     
-    print(f"Adicionando {num_to_add_gd} geradores fotovoltaicos (GD) ({GDSpread}% das UCs)")
+    print(f"Adicionando {num_to_add_gd} geradores fotovoltaicos (GD) ({config['GDSpread']}% das UCs)")
     return loads_with_gd
 
 def check_and_fix_connectivity(lines_df, loads_df, transformers_df):
@@ -147,31 +352,9 @@ def check_and_fix_connectivity(lines_df, loads_df, transformers_df):
     transformer_bus_map = dict(zip(transformers_df['COD_ID'], transformers_df['PAC_2']))
     transformer_phases_map = dict(zip(transformers_df['COD_ID'], transformers_df['FAS_CON_S']))
     
-    # Criar dicionários de conexões por tipo
-    ssdbt_connections = {}
-    ramlig_connections = {}
-    
-    # Mapear conexões SSDBT existentes
-    for _, row in ssdbt_df.iterrows():
-        if pd.isna(row['PAC_1']) or pd.isna(row['PAC_2']):
-            continue
-        if row['PAC_1'] not in ssdbt_connections:
-            ssdbt_connections[row['PAC_1']] = set()
-        if row['PAC_2'] not in ssdbt_connections:
-            ssdbt_connections[row['PAC_2']] = set()
-        ssdbt_connections[row['PAC_1']].add(row['PAC_2'])
-        ssdbt_connections[row['PAC_2']].add(row['PAC_1'])
-    
-    # Mapear conexões RAMLIG existentes
-    for _, row in ramlig_df.iterrows():
-        if pd.isna(row['PAC_1']) or pd.isna(row['PAC_2']):
-            continue
-        if row['PAC_1'] not in ramlig_connections:
-            ramlig_connections[row['PAC_1']] = set()
-        if row['PAC_2'] not in ramlig_connections:
-            ramlig_connections[row['PAC_2']] = set()
-        ramlig_connections[row['PAC_1']].add(row['PAC_2'])
-        ramlig_connections[row['PAC_2']].add(row['PAC_1'])
+    # Mapear conexões SSDBT e RAMLIG existentes (listas de adjacência)
+    ssdbt_connections = build_connections(ssdbt_df)
+    ramlig_connections = build_connections(ramlig_df)
 
     # Calcular médias para SSDBT e RAMLIG
     def calculate_averages(df):
@@ -188,6 +371,11 @@ def check_and_fix_connectivity(lines_df, loads_df, transformers_df):
     ssdbt_avg = calculate_averages(ssdbt_df)
     ramlig_avg = calculate_averages(ramlig_df)
 
+    # Uma única passada pelo grafo SSDBT: cada barramento recebe o número do seu
+    # componente conexo, e os barramentos alcançáveis a partir de um transformador
+    # são os do mesmo componente do seu PAC_2
+    component_of = label_components(ssdbt_connections)
+
     def check_path_to_transformer(load_bus, transformer_bus):
         """
         Verifica se existe um caminho válido da carga até o transformador
@@ -196,88 +384,201 @@ def check_and_fix_connectivity(lines_df, loads_df, transformers_df):
         if load_bus not in ramlig_connections:
             return False, None
 
-        for intermediate_bus in ramlig_connections[load_bus]:
-            visited = set([load_bus])
-            to_check = [intermediate_bus]
-            
-            while to_check:
-                current = to_check.pop(0)
-                if current == transformer_bus:
-                    return True, intermediate_bus
-                
-                if current not in visited and current in ssdbt_connections:
-                    visited.add(current)
-                    to_check.extend(ssdbt_connections[current])
-        
-        return False, None
+        # Carga que também é barramento SSDBT: o caminho não pode passar por ela,
+        # então a busca é feita só para essa carga
+        if load_bus in ssdbt_connections:
+            for intermediate_bus in ramlig_connections[load_bus]:
+                visited = {load_bus}
+                to_check = deque([intermediate_bus])
+                while to_check:
+                    current = to_check.popleft()
+                    if current == transformer_bus:
+                        return True, intermediate_bus
+                    if current not in visited and current in ssdbt_connections:
+                        visited.add(current)
+                        to_check.extend(ssdbt_connections[current])
+            return False, None
 
-    new_lines = []
-    processed_loads = set()
+        transformer_component = component_of.get(transformer_bus)
+        for intermediate_bus in ramlig_connections[load_bus]:
+            if intermediate_bus == transformer_bus or (
+                    transformer_component is not None and component_of.get(intermediate_bus) == transformer_component):
+                return True, intermediate_bus
 
-    # Verificar cada carga
-    for _, load in loads_df.iterrows():
-        if pd.isna(load['PAC']) or load['PAC'] in processed_loads:
-            continue
+        return False, None
 
-        load_bus = load['PAC']
-        transformer_id = load['UNI_TR_MT']
-        
-        if transformer_id not in transformer_bus_map:
-            continue
-            
-        transformer_bus = transformer_bus_map[transformer_id]
-        transformer_phases = transformer_phases_map[transformer_id]
+    # Cada PAC é verificado uma única vez (primeira carga com transformador conhecido)
+    loads = loads_df[loads_df['PAC'].notna() & loads_df['UNI_TR_MT'].isin(transformer_bus_map.keys())]
+    loads = loads.drop_duplicates('PAC')
 
-        # Verificar conectividade existente
-        has_path, intermediate_bus = check_path_to_transformer(load_bus, transformer_bus)
-        
+    disconnected = []
+    for load_bus, transformer_id, fas_con in zip(loads['PAC'], loads['UNI_TR_MT'], loads['FAS_CON']):
+        has_path, _ = check_path_to_transformer(load_bus, transformer_bus_map[transformer_id])
         if not has_path:
-            # Criar PAC intermediário
-            intermediate_bus = f"PAC_INT_{transformer_id}_{load_bus}"
-            
-            # Criar RAMLIG
-            new_lines.append({
-                'PAC_1': load_bus,
-                'PAC_2': intermediate_bus,
-                'COMP': ramlig_avg['COMP'],
-                'UNI_TR_MT': transformer_id,
-                'TIP_CND': 'RAMLIG',
-                'FAS_CON': load['FAS_CON'] if pd.notnull(load['FAS_CON']) else transformer_phases,
-                'R1': ramlig_avg['R1'],
-                'X1': ramlig_avg['X1'],
-                'CNOM': ramlig_avg['CNOM'],
-                'CMAX': ramlig_avg['CMAX']
-            })
-            
-            # Criar SSDBT
-            new_lines.append({
-                'PAC_1': intermediate_bus,
-                'PAC_2': transformer_bus,
-                'COMP': ssdbt_avg['COMP'],
-                'UNI_TR_MT': transformer_id,
-                'TIP_CND': 'SSDBT',
-                'FAS_CON': transformer_phases,
-                'R1': ssdbt_avg['R1'],
-                'X1': ssdbt_avg['X1'],
-                'CNOM': ssdbt_avg['CNOM'],
-                'CMAX': ssdbt_avg['CMAX']
-            })
-
-        processed_loads.add(load_bus)
-
-    # Adicionar novas linhas ao dataframe
-    if new_lines:
-        new_lines_df = pd.DataFrame(new_lines)
-        print(f"Adicionadas {len(new_lines)} novas linhas para garantir conectividade")
+            disconnected.append((load_bus, transformer_id, fas_con))
+
+    # Criar, para cada carga desconectada, um PAC intermediário com uma RAMLIG
+    # (carga -> PAC intermediário) seguida de uma SSDBT (PAC intermediário -> transformador)
+    if disconnected:
+        load_buses, transformer_ids, load_phases = (list(values) for values in zip(*disconnected))
+        intermediate_buses = [f"PAC_INT_{transformer_id}_{load_bus}"
+                              for load_bus, transformer_id in zip(load_buses, transformer_ids)]
+        transformer_buses = [transformer_bus_map[transformer_id] for transformer_id in transformer_ids]
+        transformer_phases = [transformer_phases_map[transformer_id] for transformer_id in transformer_ids]
+        load_phases = [phases if pd.notnull(phases) else transformer
+                       for phases, transformer in zip(load_phases, transformer_phases)]
+
+        def interleave(ramlig_values, ssdbt_values):
+            values = [None] * (2 * len(ramlig_values))
+            values[0::2] = ramlig_values
+            values[1::2] = ssdbt_values
+            return values
+
+        count = len(disconnected)
+        new_lines_df = pd.DataFrame({
+            'PAC_1': interleave(load_buses, intermediate_buses),
+            'PAC_2': interleave(intermediate_buses, transformer_buses),
+            'COMP': interleave([ramlig_avg['COMP']] * count, [ssdbt_avg['COMP']] * count),
+            'UNI_TR_MT': interleave(transformer_ids, transformer_ids),
+            'TIP_CND': interleave(['RAMLIG'] * count, ['SSDBT'] * count),
+            'FAS_CON': interleave(load_phases, transformer_phases),
+            'R1': interleave([ramlig_avg['R1']] * count, [ssdbt_avg['R1']] * count),
+            'X1': interleave([ramlig_avg['X1']] * count, [ssdbt_avg['X1']] * count),
+            'CNOM': interleave([ramlig_avg['CNOM']] * count, [ssdbt_avg['CNOM']] * count),
+            'CMAX': interleave([ramlig_avg['CMAX']] * count, [ssdbt_avg['CMAX']] * count),
+        })
+        print(f"Adicionadas {len(new_lines_df)} novas linhas para garantir conectividade")
         lines_df = pd.concat([lines_df, new_lines_df], ignore_index=True)
 
     return lines_df
 
-# Função para converter valores para float corretamente
-def safe_to_numeric(value):
-    if isinstance(value, str):
-        value = value.replace(',', '.')
-    return pd.to_numeric(value, errors='coerce')
+# Função para montar a lista de adjacência (barramento -> vizinhos) de um conjunto de linhas
+def build_connections(df):
+    connections = {}
+    valid = df['PAC_1'].notna() & df['PAC_2'].notna()
+    for pac_1, pac_2 in zip(df['PAC_1'][valid], df['PAC_2'][valid]):
+        connections.setdefault(pac_1, set()).add(pac_2)
+        connections.setdefault(pac_2, set()).add(pac_1)
+    return connections
+
+# Função para numerar os componentes conexos de um grafo (busca em largura, tempo linear)
+def label_components(connections):
+    component_of = {}
+    for start in connections:
+        if start in component_of:
+            continue
+        component = len(component_of)
+        component_of[start] = component
+        to_check = deque([start])
+        while to_check:
+            current = to_check.popleft()
+            for neighbor in connections[current]:
+                if neighbor not in component_of:
+                    component_of[neighbor] = component
+                    to_check.append(neighbor)
+    return component_of
+
+# Função para calcular a chave do cache de topologia a partir das tabelas de entrada e do escopo
+def topology_cache_key(*tables):
+    digest = hashlib.sha256()
+    digest.update(f"v{TOPOLOGY_CACHE_VERSION}|{','.join(map(str, escopo_alvo))}".encode())
+    for df in tables:
+        digest.update(repr([(column, str(dtype)) for column, dtype in df.dtypes.items()]).encode())
+        digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+# Função para obter as linhas com a conectividade corrigida, reaproveitando o
+# resultado salvo em disco quando as entradas (e o escopo) não mudaram
+def repaired_lines(lines_df, loads_df, transformers_df):
+    if not use_topology_cache:
+        return check_and_fix_connectivity(lines_df, loads_df, transformers_df)
+
+    key = topology_cache_key(lines_df, loads_df, transformers_df)
+    cache_file = os.path.join(TOPOLOGY_CACHE_PATH, f"topology-{key[:16]}.pkl")
+    if os.path.exists(cache_file):
+        try:
+            return pd.read_pickle(cache_file)
+        except Exception as e:
+            print(f"Cache de topologia inválido ({e}), recalculando...")
+
+    lines_df = check_and_fix_connectivity(lines_df, loads_df, transformers_df)
+
+    # Escrever em arquivo temporário e renomear (vários processos podem gerar o mesmo cache)
+    os.makedirs(TOPOLOGY_CACHE_PATH, exist_ok=True)
+    temp_file = f"{cache_file}.{os.getpid()}.tmp"
+    lines_df.to_pickle(temp_file)
+    os.replace(temp_file, cache_file)
+    return lines_df
+
+# Classe com a rede do escopo carregada uma única vez por processo
+class NetworkData:
+    """
+    Tabelas da BDGD lidas uma única vez, já filtradas pelo escopo_alvo e traduzidas,
+    compartilhadas por todas as etapas de escrita do DSS:
+    - transformers: UNTRMT do escopo
+    - transformer_equipment: primeiro EQTRMT de cada transformador (índice por UNI_TR_MT)
+    - lines: SSDBT + RAMLIG com os condutores (SEGCON) e a conectividade corrigida
+    - loads: UCBT do escopo com TEN_FORN traduzida
+    - load_curves: CRVCRG do tipo de dia definido
+    """
+    def __init__(self):
+        CSV_DATA = {key: load_csv(file) for key, file in {
+            'UNTRMT': 'UNTRMT.csv',
+            'EQTRMT': 'EQTRMT.csv',
+            'SSDBT': 'SSDBT.csv',
+            'RAMLIG': 'RAMLIG.csv',
+            'SEGCON': 'SEGCON.csv',
+            'UCBT': 'UCBT_tab.csv',
+            'CRVCRG': 'CRVCRG.csv',
+            'TTEN': 'TTEN.csv'
+        }.items()}
+
+        DICT_DATA = {key: load_dict(file) for key, file in {
+            'TTEN': 'TTEN.csv',
+            'TPOT': 'TPOT.csv'
+        }.items()}
+
+        # Transformadores: traduzir potência e tensões dos equipamentos
+        translate_code(CSV_DATA['EQTRMT'], 'POT_NOM', DICT_DATA['TPOT'], 'COD_ID', 'POT')
+        translate_code(CSV_DATA['EQTRMT'], 'TEN_PRI', DICT_DATA['TTEN'], 'COD_ID', 'TEN')
+        translate_code(CSV_DATA['EQTRMT'], 'TEN_SEC', DICT_DATA['TTEN'], 'COD_ID', 'TEN')
+        self.transformers = CSV_DATA['UNTRMT'][CSV_DATA['UNTRMT']['COD_ID'].isin(escopo_alvo)]
+        self.transformer_equipment = CSV_DATA['EQTRMT'].drop_duplicates('UNI_TR_MT').set_index('UNI_TR_MT')
+
+        # Linhas: traduzir os condutores, concatenar linhas e ramais e ajustar conectividade
+        ssdbt = CSV_DATA['SSDBT'].merge(CSV_DATA['SEGCON'], how='left', left_on='TIP_CND', right_on='COD_ID')
+        ramlig = CSV_DATA['RAMLIG'].merge(CSV_DATA['SEGCON'], how='left', left_on='TIP_CND', right_on='COD_ID')
+        ssdbt = ssdbt[ssdbt['UNI_TR_MT'].isin(escopo_alvo)]
+        ramlig = ramlig[ramlig['UNI_TR_MT'].isin(escopo_alvo)]
+        all_lines = pd.concat([ssdbt, ramlig], ignore_index=True)
+        self.lines = repaired_lines(all_lines, CSV_DATA['UCBT'], CSV_DATA['UNTRMT'])
+
+        # Cargas: traduzir a tensão de fornecimento
+        translate_code(CSV_DATA['UCBT'], 'TEN_FORN', CSV_DATA['TTEN'], 'COD_ID', 'TEN')
+        self.loads = CSV_DATA['UCBT'][CSV_DATA['UCBT']['UNI_TR_MT'].isin(escopo_alvo)]
+
+        # Curvas de carga do tipo de dia definido
+        curves = CSV_DATA['CRVCRG']
+        self.load_curves = curves[curves['TIP_DIA'] == default_day_type]
+
+# Rede carregada no processo (recarregada apenas se os caminhos ou o escopo mudarem)
+_network_data = None
+_network_key = None
+
+# Função para obter a rede do escopo, lendo os arquivos apenas na primeira chamada
+def get_network_data():
+    global _network_data, _network_key
+    key = (CSV_PATH, DICT_PATH, tuple(escopo_alvo), default_day_type)
+    if _network_data is None or _network_key != key:
+        print("Loading network data...")
+        _network_data = NetworkData()
+        _network_key = key
+    return _network_data
+
+# Função para converter uma coluna inteira para float (vírgula decimal aceita)
+def safe_to_numeric_column(values):
+    return pd.to_numeric(values.astype(object).map(lambda v: v.replace(',', '.') if isinstance(v, str) else v),
+                         errors='coerce')
 
 # Função para escrever o cabeçalho e configuração do circuito
 def write_circuit_configuration(dss_file):
@@ -301,89 +602,53 @@ def write_circuit_configuration(dss_file):
     dss_file.write("Set algorithm=newton\n")       # Usar método Newton-Raphson
     dss_file.write("Set tolerance=0.0001\n")       # Ajustar tolerância
     dss_file.write("Set voltagebases=[13.8, 0.22]\n\n")
-
-
-    dss_file.write("Calcvoltagebases\n\n")
     
 # Função para escrever os transformadores de média tensão
-def write_medium_voltage_transformers(dss_file):
-    # Carregar dados necessários
-    CSV_DATA = {key: load_csv(file) for key, file in {
-        'UNTRMT': 'UNTRMT.csv',
-        'EQTRMT': 'EQTRMT.csv'
-    }.items()}
-
-    DICT_DATA = {key: load_dict(file) for key, file in {
-        'TTEN': 'TTEN.csv',
-        'TPOT': 'TPOT.csv'
-    }.items()}
-
-    # Traduzir colunas relevantes
-    translate_code(CSV_DATA['EQTRMT'], 'POT_NOM', DICT_DATA['TPOT'], 'COD_ID', 'POT')
-    translate_code(CSV_DATA['EQTRMT'], 'TEN_PRI', DICT_DATA['TTEN'], 'COD_ID', 'TEN')
-    translate_code(CSV_DATA['EQTRMT'], 'TEN_SEC', DICT_DATA['TTEN'], 'COD_ID', 'TEN')
-
-    # Filtrar transformadores válidos
-    valid_transformers = CSV_DATA['UNTRMT'][
-        CSV_DATA['UNTRMT']['COD_ID'].isin(escopo_alvo)
-    ]
+def write_medium_voltage_transformers(dss_file, data):
+    transformers = data.transformers[data.transformers['COD_ID'].isin(data.transformer_equipment.index)]
+    equipment = data.transformer_equipment.loc[transformers['COD_ID'].tolist()]
+
+    # Potência nominal em VA; transformadores sem potência válida são ignorados
+    pot_nom = safe_to_numeric_column(equipment['POT_NOM']).to_numpy() * 1000
+    valid = ~(np.isnan(pot_nom) | (pot_nom == 0))
+    for cod_id in transformers['COD_ID'][~valid]:
+        print(f"AVISO: Transformador {cod_id} ignorado devido à potência nominal inválida.")
+    transformers = transformers[valid]
+    equipment = equipment[valid]
+    pot_nom = pot_nom[valid]
+
+    conn_primary = np.where([isinstance(v, str) and len(v) == 3 for v in transformers['FAS_CON_P']], 'delta', 'wye')
+    conn_secondary = np.where(transformers['FAS_CON_S'].astype(object) == 'ABCN', 'wye', 'delta')
+    phases_primary = determine_phases_column(transformers['FAS_CON_P'])
+    primary_kv = pd.to_numeric(equipment['TEN_PRI'], errors='coerce').to_numpy() / 1000
+    secondary_kv = pd.to_numeric(equipment['TEN_SEC'], errors='coerce').to_numpy() / 1000
+
+    # Converter perdas para porcentagem (valores < 10 estão em kW)
+    per_tot = safe_to_numeric_column(equipment['PER_TOT']).to_numpy()
+    per_fer = safe_to_numeric_column(equipment['PER_FER']).to_numpy()
+    per_tot = np.where(per_tot < 10, ((per_tot * 1000) / pot_nom) * 100, (per_tot / pot_nom) * 100)
+    per_fer = np.where(per_fer < 10, ((per_fer * 1000) / pot_nom) * 100, (per_fer / pot_nom) * 100)
+
+    kvs = zip(format_column(primary_kv, '%.3f'), format_column(secondary_kv, '%.3f'))
+    kvas = format_column(pot_nom / 1000, '%.1f')
+    losses = zip(format_column(per_tot, '%.3f'), format_column(per_fer, '%.3f'))
 
     dss_file.write("! Medium Voltage Transformers\n")
-    for _, row in valid_transformers.iterrows():
-        eq_row = CSV_DATA['EQTRMT'][CSV_DATA['EQTRMT']['UNI_TR_MT'] == row['COD_ID']]
-        if not eq_row.empty:
-            eq_row = eq_row.iloc[0]
-            secondary_bus = row['PAC_2']
-            conn_primary = 'delta' if len(row['FAS_CON_P']) == 3 else 'wye'
-            conn_secondary = 'wye' if row['FAS_CON_S'] == 'ABCN' else 'delta'
-            phases_primary = determine_phases(row['FAS_CON_P'])
-            phases_secondary = determine_phases(row['FAS_CON_S'])
-            primary_kv = pd.to_numeric(eq_row['TEN_PRI'], errors='coerce') / 1000
-            secondary_kv = pd.to_numeric(eq_row['TEN_SEC'], errors='coerce') / 1000
-            pot_nom = safe_to_numeric(eq_row['POT_NOM']) * 1000  # Converter de kVA para VA
-
-            # Verificar se potência nominal é válida
-            if pd.isna(pot_nom) or pot_nom == 0:
-                print(f"AVISO: Transformador {row['COD_ID']} ignorado devido à potência nominal inválida.")
-                continue
-
-            # Calcular perdas corretamente
-            per_tot = safe_to_numeric(eq_row['PER_TOT'])
-            per_fer = safe_to_numeric(eq_row['PER_FER'])
-
-            # Converter perdas para porcentagem
-            per_tot = ((per_tot * 1000) / pot_nom) * 100 if per_tot < 10 else (per_tot / pot_nom) * 100
-            per_fer = ((per_fer * 1000) / pot_nom) * 100 if per_fer < 10 else (per_fer / pot_nom) * 100
-
-            dss_file.write(f"New Transformer.{row['COD_ID']} Phases={phases_primary} Windings=2\n")
-            dss_file.write(f"~ Buses=[sourcebus.1.2.3, {secondary_bus}.1.2.3] Conns=[{conn_primary} {conn_secondary}]\n")  # Especificar fases explicitamente
-            dss_file.write(f"~ kVs=[{primary_kv:.3f} {secondary_kv:.3f}] kVAs=[{pot_nom/1000:.1f} {pot_nom/1000:.1f}]\n")
-            dss_file.write(f"~ %LoadLoss={per_tot:.3f} %NoLoadLoss={per_fer:.3f} XHL={eq_row['XHL']}\n")
+    dss_file.write("".join(
+        f"New Transformer.{cod_id} Phases={phases} Windings=2\n"
+        f"~ Buses=[sourcebus.1.2.3, {bus}.1.2.3] Conns=[{conn_p} {conn_s}]\n"
+        f"~ kVs=[{kv_p} {kv_s}] kVAs=[{kva} {kva}]\n"
+        f"~ %LoadLoss={loss_tot} %NoLoadLoss={loss_fer} XHL={xhl}\n"
+        for cod_id, phases, bus, conn_p, conn_s, (kv_p, kv_s), kva, (loss_tot, loss_fer), xhl in zip(
+            transformers['COD_ID'].tolist(), phases_primary, transformers['PAC_2'].tolist(),
+            conn_primary, conn_secondary, kvs, kvas, losses, number_text(equipment['XHL']))
+    ))
 
 # Função para escrever as linhas de baixa tensão
-def write_low_voltage_lines(dss_file):
-    CSV_DATA = {key: load_csv(file) for key, file in {
-        'SSDBT': 'SSDBT.csv',
-        'RAMLIG': 'RAMLIG.csv',
-        'SEGCON': 'SEGCON.csv',
-        'UCBT': 'UCBT_tab.csv',
-        'UNTRMT': 'UNTRMT.csv'
-    }.items()}
-    
-    # Traduzir os condutores
-    CSV_DATA['SSDBT'] = CSV_DATA['SSDBT'].merge(CSV_DATA['SEGCON'], how='left', left_on='TIP_CND', right_on='COD_ID')
-    CSV_DATA['RAMLIG'] = CSV_DATA['RAMLIG'].merge(CSV_DATA['SEGCON'], how='left', left_on='TIP_CND', right_on='COD_ID')
-    
-    # Filtrar somente linhas do escopo alvo
-    CSV_DATA['SSDBT'] = CSV_DATA['SSDBT'][CSV_DATA['SSDBT']['UNI_TR_MT'].isin(escopo_alvo)]
-    CSV_DATA['RAMLIG'] = CSV_DATA['RAMLIG'][CSV_DATA['RAMLIG']['UNI_TR_MT'].isin(escopo_alvo)]
-    
-    # Concatenar linhas e ramais
-    all_lines = pd.concat([CSV_DATA['SSDBT'], CSV_DATA['RAMLIG']], ignore_index=True)
-    
-    # Ajustar conectividade
-    all_lines = check_and_fix_connectivity(all_lines, CSV_DATA['UCBT'], CSV_DATA['UNTRMT'])
-    
+def write_low_voltage_lines(dss_file, data):
+    # Linhas e ramais com conectividade já ajustada
+    all_lines = data.lines
+
     # Valores padrão para substituir NaN
     default_values = {
         'R1': 0.25,
@@ -394,39 +659,37 @@ def write_low_voltage_lines(dss_file):
         'FAS_CON': 'ABC'  # Configuração trifásica como padrão
     }
     
-# Escrever linhas no arquivo DSS
-    dss_file.write("! Low Voltage Lines\n")
-    for _, row in all_lines.iterrows():
-        # Substituir valores NaN por padrões
-        r1 = float(row['R1']) if pd.notnull(row['R1']) else default_values['R1']
-        x1 = float(row['X1']) if pd.notnull(row['X1']) else default_values['X1']
-        cnom = float(row['CNOM']) if pd.notnull(row['CNOM']) else default_values['CNOM']
-        cmax = float(row['CMAX']) if pd.notnull(row['CMAX']) else default_values['CMAX']
-        comp = float(row['COMP']) if pd.notnull(row['COMP']) else default_values['COMP']
-        
-        # Converter ohm/km para ohm total na linha
-        comp_km = comp / 1000.0  # Converter o comprimento de metros para km
-        r1_ohm = r1 * comp_km   # Resistência total para o comprimento da linha
-        x1_ohm = x1 * comp_km    # Reatância total para o comprimento da linha
+    # Substituir valores NaN por padrões
+    r1, _ = numeric_column(all_lines['R1'], default_values['R1'])
+    x1, _ = numeric_column(all_lines['X1'], default_values['X1'])
+    _, cnom = numeric_column(all_lines['CNOM'], default_values['CNOM'])
+    _, cmax = numeric_column(all_lines['CMAX'], default_values['CMAX'])
+    comp, comp_text = numeric_column(all_lines['COMP'], default_values['COMP'])
 
-        
-        phases = determine_phases(row['FAS_CON'] if pd.notnull(row['FAS_CON']) else default_values['FAS_CON'])
-        dss_file.write(f"New Line.{row['PAC_1']}_{row['PAC_2']} Phases={phases}\n")
-        dss_file.write(f"~ Bus1={row['PAC_1']}.1.2.3 Bus2={row['PAC_2']}.1.2.3\n")  # Especificar fases explicitamente
-        dss_file.write(f"~ Length={comp} units=m\n")
-        
-        # Usar os valores convertidos (em ohm) para o comprimento específico da linha
-        dss_file.write(f"~ R1={r1_ohm:.6f} X1={x1_ohm:.6f} C1=0.0\n")
-        
-        dss_file.write(f"~ NormAmps={cnom} EmergAmps={cmax}\n")
+    # Converter ohm/km para ohm total na linha (comprimento em metros)
+    comp_km = comp / 1000.0
+    r1_ohm = format_column(r1 * comp_km, '%.6f')
+    x1_ohm = format_column(x1 * comp_km, '%.6f')
 
-# Função para escrever as curvas de carga
-def write_load_curves(dss_file):
-    # Carregar dados necessários
-    curves = load_csv('CRVCRG.csv')
+    phases = determine_phases_column(all_lines['FAS_CON'].astype(object).fillna(default_values['FAS_CON']))
 
-    # Filtrar pelas curvas do tipo de dia definido
-    filtered_curves = curves[curves['TIP_DIA'] == default_day_type]
+    # Escrever linhas no arquivo DSS (fases especificadas explicitamente nos barramentos)
+    dss_file.write("! Low Voltage Lines\n")
+    dss_file.write("".join(
+        f"New Line.{pac_1}_{pac_2} Phases={n_phases}\n"
+        f"~ Bus1={pac_1}.1.2.3 Bus2={pac_2}.1.2.3\n"
+        f"~ Length={length} units=m\n"
+        f"~ R1={r1_value} X1={x1_value} C1=0.0\n"
+        f"~ NormAmps={norm_amps} EmergAmps={emerg_amps}\n"
+        for pac_1, pac_2, n_phases, length, r1_value, x1_value, norm_amps, emerg_amps in zip(
+            all_lines['PAC_1'].tolist(), all_lines['PAC_2'].tolist(), phases,
+            comp_text, r1_ohm, x1_ohm, cnom, cmax)
+    ))
+
+# Função para escrever as curvas de carga
+def write_load_curves(dss_file, data):
+    # Curvas já filtradas pelo tipo de dia definido
+    filtered_curves = data.load_curves
 
     # Calcular valores em p.u. e escrever no arquivo DSS
     dss_file.write("! Load Curves\n")
@@ -510,54 +773,51 @@ def write_photovoltaic_generation_curve(dss_file):
 
     
 # Função para escrever as cargas em baixa tensão
-def write_loads(dss_file):
-    CSV_DATA = {key: load_csv(file) for key, file in {
-        'UCBT': 'UCBT_tab.csv'
-    }.items()}
-    
-    DICT_DATA = {key: load_csv(file) for key, file in {
-        'TTEN': 'TTEN.csv'
-    }.items()}
-    
-    translate_code(CSV_DATA['UCBT'], 'TEN_FORN', DICT_DATA['TTEN'], 'COD_ID', 'TEN')
-    valid_loads = CSV_DATA['UCBT'][CSV_DATA['UCBT']['UNI_TR_MT'].isin(escopo_alvo)]
+def write_loads(dss_file, data, config=None):
+    write_base_loads(dss_file, data)
+    write_scenario_loads(dss_file, data, config)
+
+# Função para escrever as cargas existentes (iguais em todos os cenários)
+def write_base_loads(dss_file, data):
+    valid_loads = data.loads
+    dss_file.write("! Loads\n")
+    write_load_block(dss_file, valid_loads, "Load", "", number_text(valid_loads['CAR_INST']), valid_loads['TIP_CC'].tolist())
+
+# Função para escrever os elementos de cada cenário (carregadores de EV e geradores fotovoltaicos)
+def write_scenario_loads(dss_file, data, config=None, selection=None):
+    valid_loads = data.loads
 
     # Aplicar aumento de carga para veículos elétricos
-    additional_loads = apply_load_increase(valid_loads)
+    additional_loads = apply_load_increase(valid_loads, config, selection)
     
     # Aplicar geração distribuída fotovoltaica
-    pv_loads = apply_distributed_generation(valid_loads)
-
-    # Escrever cargas no arquivo DSS
-    dss_file.write("! Loads\n")
-    for _, row in valid_loads.iterrows():
-        phases = determine_phases(row['FAS_CON'])
-        load_name = f"{row['PAC']}_{_}"
-        # Especificar conexão e fases explicitamente
-        conn = "delta" if phases == 3 else "wye"
-        dss_file.write(f"New Load.{load_name} Phases={phases} Bus1={row['PAC']}.1.2.3\n")
-        dss_file.write(f"~ kV={float(row['TEN_FORN']) / 1000:.3f} Conn={conn}\n")
-        dss_file.write(f"~ kW={row['CAR_INST']} PF={default_powerfactor} Model=1 Daily={row['TIP_CC']}\n")
+    pv_loads = apply_distributed_generation(valid_loads, config, selection)
 
     # Escrever cargas adicionais para veículos elétricos
-    for _, row in additional_loads.iterrows():
-        phases = determine_phases(row['FAS_CON'])
-        load_name = f"Recharger_{row['PAC']}_{_}"
-        dss_file.write(f"New Load.{load_name} Phases={phases} Bus1={row['PAC']}.1.2.3\n")
-        dss_file.write(f"~ kV={float(row['TEN_FORN']) / 1000:.3f} Conn={'delta' if phases == 3 else 'wye'}\n")
-        dss_file.write(f"~ kW={row['kW_increased']} PF={default_powerfactor} Model=1 Daily={row['TIP_CC']}\n")
-    
-    # Escrever geradores fotovoltaicos
+    write_load_block(dss_file, additional_loads, "Load", "Recharger_",
+                     additional_loads['kW_increased'].tolist(), additional_loads['TIP_CC'].tolist())
+
+    # Escrever geradores fotovoltaicos (75% da carga instalada)
     dss_file.write("\n! Distributed Generation (Photovoltaic)\n")
-    for _, row in pv_loads.iterrows():
-        phases = determine_phases(row['FAS_CON'])
-        gen_name = f"PV_{row['PAC']}_{_}"
-        dss_file.write(f"New Generator.{gen_name} Phases={phases} Bus1={row['PAC']}.1.2.3\n")
-        dss_file.write(f"~ kV={float(row['TEN_FORN']) / 1000:.3f} Conn={'delta' if phases == 3 else 'wye'}\n")
-        dss_file.write(f"~ kW={float(row['CAR_INST']) * (3/4) } PF={default_powerfactor} Model=1 Daily=CurvaGD\n")
+    pv_kw = (pv_loads['CAR_INST'].astype(float).to_numpy() * (3/4)).astype(str)
+    write_load_block(dss_file, pv_loads, "Generator", "PV_", pv_kw, ["CurvaGD"] * len(pv_loads))
+
+# Função para escrever um bloco de cargas ou geradores em uma única escrita
+def write_load_block(dss_file, loads_df, element, prefix, kw_values, daily_values):
+    phases = determine_phases_column(loads_df['FAS_CON'])
+    conn = np.where(phases == 3, "delta", "wye")  # Especificar conexão e fases explicitamente
+    kv = format_column(loads_df['TEN_FORN'].astype(object).astype(float).to_numpy() / 1000, '%.3f')
+
+    dss_file.write("".join(
+        f"New {element}.{prefix}{pac}_{index} Phases={n_phases} Bus1={pac}.1.2.3\n"
+        f"~ kV={kv_value} Conn={conn_value}\n"
+        f"~ kW={kw} PF={default_powerfactor} Model=1 Daily={daily}\n"
+        for pac, index, n_phases, kv_value, conn_value, kw, daily in zip(
+            loads_df['PAC'].tolist(), loads_df.index.tolist(), phases, kv, conn, kw_values, daily_values)
+    ))
 
 # Função para escrever os comandos de monitores
-def write_monitors(dss_file):
+def write_monitors(dss_file, headless=False):
     dss_file.write("\n! Monitors\n")
     for transformer_id in escopo_alvo:
         dss_file.write(f"New Monitor.{transformer_id}_voltage Element=Transformer.{transformer_id} Terminal=2 Mode=0\n")
@@ -569,112 +829,246 @@ def write_monitors(dss_file):
     dss_file.write("\n! Final Solution Commands\n")
     dss_file.write("Set MaxControlIter=100\n")
     dss_file.write("Solve MaxControl=100 number=96\n")
+    if headless:
+        return
     dss_file.write("Show Voltage LN Nodes\n")
     dss_file.write("Show Voltage Elements\n")
     dss_file.write("Show Powers kVA Elements\n")
     dss_file.write("Show Losses\n")
 
-# Gerar arquivo DSS
-def generate_dss():
-    file_name = f"kW={int(rechargerload)}--EV={EVSpread}--GD={GDSpread}--RS={random_seed}--V3.0.dss"
-    file_path = os.path.join(DSS_PATH, file_name)
-
-    with open(file_path, 'w') as dss_file:
-        # 1. Configuração básica e parâmetros de solução
-        dss_file.write("Clear\n\n")
-
-        # 2. Definição do Circuito
-        dss_file.write("! Circuit Definition\n")
-        dss_file.write("New Circuit.MyCircuit")
-        dss_file.write(" bus1=sourcebus.1.2.3.0")
-        dss_file.write(f" basekv={medium_voltage_base}")
-        dss_file.write(" pu=1.0")
-        dss_file.write(" phases=3")
-        dss_file.write(" MVAsc3=2000")
-        dss_file.write(" MVAsc1=2100\n\n")
-        
-        dss_file.write("! Solution Parameters\n")
-        dss_file.write("Set DefaultBaseFreq=60\n")
-        dss_file.write("Set maxiterations=100\n")
-        dss_file.write("Set maxcontroliter=100\n")
-        dss_file.write("Set algorithm=newton\n")
-        dss_file.write("Set tolerance=0.0001\n")
-        dss_file.write(f"Set voltagebases=[{medium_voltage_base}, {low_voltage_base}]\n\n")
-        
-        # Informações da simulação como comentário
-        dss_file.write(f"! Simulation Parameters:\n")
-        dss_file.write(f"! - EV Load: {rechargerload} kW\n")
-        dss_file.write(f"! - EV Spread: {EVSpread}%\n") 
-        dss_file.write(f"! - DG Spread: {GDSpread}%\n\n")
-
-        dss_file.write("Calcvoltagebases\n\n")
-
-        # 3. Curvas de carga (definir antes dos elementos que as usarão)
-        print("Writing load curves...")
-        write_load_curves(dss_file)
-        write_recharger_load_curves(dss_file)
-        write_photovoltaic_generation_curve(dss_file)
-
-        # 4. Transformadores
-        print("Writing transformers...")
-        write_medium_voltage_transformers(dss_file)
-
-        # 5. Linhas de baixa tensão
-        print("Writing low voltage lines...")
-        write_low_voltage_lines(dss_file)
-
-        # 6. Cargas
-        print("Writing loads...")
-        write_loads(dss_file)
-        
-        # 7. Monitores (definir antes de iniciar a solução)
-        print("Setting up monitors...")
-        write_monitors(dss_file)
-
-        # 8. Primeiro resolver em modo snapshot para verificar a convergência
-        dss_file.write("\n! Initial Snapshot Solution\n")
-        dss_file.write("Set mode=snapshot\n")
-        dss_file.write("Set controlmode=static\n")
-        dss_file.write("Solve\n")
-
-        # 9. Se convergiu, passar para modo diário
-        dss_file.write("\n! Daily Mode Solution\n")
-        dss_file.write("Set mode=daily\n")
-        dss_file.write("Set stepsize=0.25h\n")  # 15 minutos
-        dss_file.write("Set number=96\n")       # 24 horas = 96 intervalos de 15 minutos
-        dss_file.write("Set controlmode=time\n")
-        
-        # 10. Resolver no modo diário
-        dss_file.write("\n! Solve Daily\n")
-        dss_file.write("Solve\n")
-        
-        # 11. Mostrar resultados
-        dss_file.write("\n! Show Results\n")
-        dss_file.write("Show Voltage LN Nodes\n")
-        dss_file.write("Show Currents Elements\n")
-        dss_file.write("Show Powers kVA Elements\n")
-        dss_file.write("Show Losses\n")
+# Função para escrever a definição do circuito e os parâmetros de solução
+def write_circuit_definition(dss_file):
+    dss_file.write("! Circuit Definition\n")
+    dss_file.write("New Circuit.MyCircuit")
+    dss_file.write(" bus1=sourcebus.1.2.3.0")
+    dss_file.write(f" basekv={medium_voltage_base}")
+    dss_file.write(" pu=1.0")
+    dss_file.write(" phases=3")
+    dss_file.write(" MVAsc3=2000")
+    dss_file.write(" MVAsc1=2100\n\n")
+    
+    dss_file.write("! Solution Parameters\n")
+    dss_file.write("Set DefaultBaseFreq=60\n")
+    dss_file.write("Set maxiterations=100\n")
+    dss_file.write("Set maxcontroliter=100\n")
+    dss_file.write("Set algorithm=newton\n")
+    dss_file.write("Set tolerance=0.0001\n")
+    dss_file.write(f"Set voltagebases=[{medium_voltage_base}, {low_voltage_base}]\n\n")
+
+# Função para escrever os parâmetros do cenário como comentário
+def write_simulation_parameters(dss_file, config=None):
+    config = scenario_config(config)
+    dss_file.write(f"! Simulation Parameters:\n")
+    dss_file.write(f"! - EV Load: {config['rechargerload']} kW\n")
+    dss_file.write(f"! - EV Spread: {config['EVSpread']}%\n") 
+    dss_file.write(f"! - DG Spread: {config['GDSpread']}%\n\n")
+
+# Função para escrever a rede comum a todos os cenários (curvas, transformadores, linhas e cargas)
+def write_base_network(dss_file, data):
+    # Curvas de carga (definir antes dos elementos que as usarão)
+    print("Writing load curves...")
+    write_load_curves(dss_file, data)
+    write_recharger_load_curves(dss_file)
+    write_photovoltaic_generation_curve(dss_file)
+
+    # Transformadores
+    print("Writing transformers...")
+    write_medium_voltage_transformers(dss_file, data)
+
+    # Linhas de baixa tensão
+    print("Writing low voltage lines...")
+    write_low_voltage_lines(dss_file, data)
+
+    # Cargas existentes
+    print("Writing loads...")
+    write_base_loads(dss_file, data)
+
+    # Tensões base calculadas depois de definidas todas as barras da rede
+    dss_file.write("\nCalcvoltagebases\n\n")
+
+# Função para escrever monitores, comandos de solução e exportação de resultados
+def write_solution(dss_file, headless=None):
+    headless = use_headless_solution if headless is None else headless
+
+    # Monitores (definir antes de iniciar a solução)
+    print("Setting up monitors...")
+    write_monitors(dss_file, headless)
+
+    # Primeiro resolver em modo snapshot para verificar a convergência
+    dss_file.write("\n! Initial Snapshot Solution\n")
+    dss_file.write("Set mode=snapshot\n")
+    dss_file.write("Set controlmode=static\n")
+    dss_file.write("Solve\n")
+
+    # Se convergiu, passar para modo diário
+    dss_file.write("\n! Daily Mode Solution\n")
+    dss_file.write("Set mode=daily\n")
+    dss_file.write("Set stepsize=0.25h\n")  # 15 minutos
+    dss_file.write("Set number=96\n")       # 24 horas = 96 intervalos de 15 minutos
+    dss_file.write("Set controlmode=time\n")
+    
+    # Resolver no modo diário
+    dss_file.write("\n! Solve Daily\n")
+    dss_file.write("Solve\n")
+
+    # Sem relatórios, exportações e gráficos (resultados lidos pela API)
+    if headless:
+        return
+    
+    # Mostrar resultados
+    dss_file.write("\n! Show Results\n")
+    dss_file.write("Show Voltage LN Nodes\n")
+    dss_file.write("Show Currents Elements\n")
+    dss_file.write("Show Powers kVA Elements\n")
+    dss_file.write("Show Losses\n")
+    
+    # Exportar resultados dos monitores
+    dss_file.write("\n! Export Monitor Data\n")
+    for transformer_id in escopo_alvo:
+        dss_file.write(f"Export Monitor {transformer_id}_voltage\n")
+        dss_file.write(f"Export Monitor {transformer_id}_current\n")
         
-        # 12. Exportar resultados dos monitores
-        dss_file.write("\n! Export Monitor Data\n")
-        for transformer_id in escopo_alvo:
-            dss_file.write(f"Export Monitor {transformer_id}_voltage\n")
-            dss_file.write(f"Export Monitor {transformer_id}_current\n")
-            
-            
-        # 13. Exportar perfis de tensão e outros resultados
-        dss_file.write("\n! Export Simulation Results\n")
-        dss_file.write("Export Voltages\n")
-        dss_file.write("Export Currents\n")
-        dss_file.write("Export Powers\n")
-        dss_file.write("Export Losses\n")
         
-        # 14. Análise final das violações de tensão
-        dss_file.write("\n! Check Voltage Violations\n")
-        dss_file.write("Show Voltages LN Nodes\n")
-        dss_file.write("Plot Profile Phases=All\n")
+    # Exportar perfis de tensão e outros resultados
+    dss_file.write("\n! Export Simulation Results\n")
+    dss_file.write("Export Voltages\n")
+    dss_file.write("Export Currents\n")
+    dss_file.write("Export Powers\n")
+    dss_file.write("Export Losses\n")
+    
+    # Análise final das violações de tensão
+    dss_file.write("\n! Check Voltage Violations\n")
+    dss_file.write("Show Voltages LN Nodes\n")
+    dss_file.write("Plot Profile Phases=All\n")
+
+# Arquivos base já escritos neste processo ({parâmetros da rede: caminho})
+_base_includes = {}
+
+# Função para obter o arquivo base do escopo, escrevendo-o apenas se ainda não existir.
+# O nome inclui o hash do conteúdo, então mudanças na rede geram um novo arquivo
+def get_base_include(data):
+    key = (id(data), medium_voltage_base, low_voltage_base, default_powerfactor, BASE_INCLUDE_PATH)
+    if key not in _base_includes:
+        buffer = io.StringIO()
+        write_circuit_definition(buffer)
+        write_base_network(buffer, data)
+        content = buffer.getvalue()
+
+        digest = hashlib.sha1(content.encode('utf-8')).hexdigest()[:16]
+        base_path = os.path.join(BASE_INCLUDE_PATH, f"Base--{digest}.dss")
+        if not os.path.exists(base_path):
+            os.makedirs(BASE_INCLUDE_PATH, exist_ok=True)
+            temp_path = f"{base_path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w') as base_file:
+                base_file.write(content)
+            os.replace(temp_path, base_path)
+            print(f"Arquivo base {os.path.basename(base_path)} gerado em {BASE_INCLUDE_PATH}.")
+        _base_includes[key] = base_path
+    return _base_includes[key]
+
+# Função para obter o caminho do arquivo base a partir do diretório do cenário
+def base_include_reference(base_path, dss_path):
+    try:
+        return os.path.relpath(base_path, dss_path)
+    except ValueError:  # Unidades diferentes no Windows
+        return os.path.abspath(base_path)
+
+# Classe para gerar vários cenários no mesmo processo
+class ScenarioGenerator:
+    """
+    Mantém a rede do escopo (e o arquivo base) carregada entre as chamadas, de modo que
+    cada cenário custe apenas o sorteio e a escrita dos seus carregadores de EV e
+    geradores fotovoltaicos.
+
+    Uso:
+        generator = ScenarioGenerator()
+        generator.generate({'EVSpread': 25, 'GDSpread': 50, 'random_seed': 3, 'DSS_PATH': pasta})
+    """
+    def __init__(self):
+        self.data = get_network_data()
+        self.placements = None
+
+    def prepare(self, seeds, ev_levels, gd_levels):
+        """Sorteia em lote as UCs de todas as sementes e percentuais (apenas no modo 'nested')"""
+        if PLACEMENT_MODE != 'nested':
+            print("AVISO: sorteio em lote disponível apenas com PLACEMENT_MODE = 'nested'.")
+            return
+        self.placements = sample_placements(len(self.data.loads), seeds, ev_levels, gd_levels)
+
+    def load_keys(self):
+        """Nome de cada UC da rede (PAC_índice), na ordem usada pelas posições dos sorteios"""
+        return [f"{pac}_{index}" for pac, index in zip(self.data.loads['PAC'].tolist(), self.data.loads.index.tolist())]
+
+    def select(self, config=None, **overrides):
+        """
+        Sorteia as UCs de um cenário sem escrever o arquivo. Retorna as posições das UCs
+        com EV (em ordem crescente), o índice da curva de cada carregador e as posições
+        das UCs com GD, no formato aceito por generate(selection=...) e pelo ScenarioStore
+        """
+        config = scenario_config(config, **overrides)
+        if self.placements is not None and PLACEMENT_MODE == 'nested':
+            selection = placement_selection(self.placements, config)
+            if selection is not None:
+                return selection
+
+        loads = self.data.loads
+        choices, _ = charger_curve_distribution()
+        ev_loads = apply_load_increase(loads, config)
+        pv_loads = apply_distributed_generation(loads, config)
+        ev_positions = loads.index.get_indexer(ev_loads.index)
+        ev_curves = pd.Index(choices).get_indexer(ev_loads['TIP_CC'].astype(object)).astype(np.int8)
+        order = np.argsort(ev_positions, kind='stable')
+        return ev_positions[order], ev_curves[order], np.sort(loads.index.get_indexer(pv_loads.index))
+
+    def fingerprint(self, config=None, selection=None, **overrides):
+        """
+        Hash do posicionamento de um cenário (UCs com EV e suas curvas, UCs com GD e carga
+        do carregador). Cenários com o mesmo hash geram o mesmo circuito
+        """
+        config = scenario_config(config, **overrides)
+        if selection is None:
+            selection = self.select(config)
+        return placement_fingerprint(selection, config)
 
-        print(f"Arquivo {file_name} gerado com sucesso em {DSS_PATH}.")
+    def generate(self, config=None, selection=None, **overrides):
+        """
+        Gera o arquivo DSS de um cenário e retorna o seu caminho. selection (ver select)
+        permite materializar um cenário já sorteado, por exemplo a partir do ScenarioStore
+        """
+        config = scenario_config(config, **overrides)
+        data = self.data
+        dss_path = config['DSS_PATH']
+        if selection is None and self.placements is not None and PLACEMENT_MODE == 'nested':
+            selection = placement_selection(self.placements, config)
+        file_name = (f"kW={int(config['rechargerload'])}--EV={config['EVSpread']}"
+                     f"--GD={config['GDSpread']}--RS={config['random_seed']}--V3.0.dss")
+        file_path = os.path.join(dss_path, file_name)
+
+        with open(file_path, 'w') as dss_file:
+            dss_file.write("Clear\n\n")
+
+            if use_base_include:
+                # Parâmetros do cenário, rede base compartilhada e elementos do cenário
+                write_simulation_parameters(dss_file, config)
+                dss_file.write("! Base Network\n")
+                dss_file.write(f"Redirect \"{base_include_reference(get_base_include(data), dss_path)}\"\n\n")
+                print("Writing scenario loads...")
+                write_scenario_loads(dss_file, data, config, selection)
+            else:
+                # Arquivo completo: circuito, parâmetros, rede e elementos do cenário
+                write_circuit_definition(dss_file)
+                write_simulation_parameters(dss_file, config)
+                write_base_network(dss_file, data)
+                write_scenario_loads(dss_file, data, config, selection)
+
+            write_solution(dss_file)
+
+        print(f"Arquivo {file_name} gerado com sucesso em {dss_path}.")
+        return file_path
+
+# Gerar arquivo DSS (configuração opcional; sem ela usa os parâmetros do módulo)
+def generate_dss(config=None):
+    return ScenarioGenerator().generate(config)
 
 
 # Executar o programa
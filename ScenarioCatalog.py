@@ -0,0 +1,224 @@
+# Catálogo dos cenários de um estudo em SQLite.
+# Registra os parâmetros (GD, EV, RS) de cada cenário e o seu estado ao longo do fluxo
+# geração -> solução -> agregação, com hashes e tempos. CenarioWriter e DSS Solver pegam
+# trabalho do catálogo em vez de testar diretórios ou percorrer o disco com os.walk, e uma
+# execução interrompida continua exatamente de onde parou.
+import os
+import hashlib
+import sqlite3
+from datetime import datetime
+
+# Estados de um cenário
+PENDING = 'pending'          # Registrado, ainda sem arquivo DSS
+GENERATING = 'generating'    # Arquivo DSS sendo escrito
+GENERATED = 'generated'      # Arquivo DSS pronto para ser resolvido
+SOLVING = 'solving'          # Sendo resolvido no OpenDSS
+SOLVED = 'solved'            # Resolvido, resultados prontos para agregação
+AGGREGATING = 'aggregating'  # Resultados sendo agregados
+AGGREGATED = 'aggregated'    # Resultados agregados
+FAILED = 'failed'            # Falhou em alguma etapa (ver coluna error)
+ALIASED = 'aliased'          # Mesmo circuito de outro cenário (alias_gd/alias_ev/alias_rs)
+
+# Estado "em andamento" de cada etapa e o estado para onde volta se a execução for interrompida
+IN_PROGRESS = {GENERATING: PENDING, SOLVING: GENERATED, AGGREGATING: SOLVED}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scenarios (
+    gd INTEGER NOT NULL,
+    ev INTEGER NOT NULL,
+    rs INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    dss_path TEXT,
+    dss_hash TEXT,
+    placement_hash TEXT,
+    alias_gd INTEGER,
+    alias_ev INTEGER,
+    alias_rs INTEGER,
+    result_hash TEXT,
+    generate_seconds REAL,
+    solve_seconds REAL,
+    aggregate_seconds REAL,
+    max_v_pu REAL,
+    min_v_pu REAL,
+    max_loading REAL,
+    failed_stage TEXT,
+    error TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (gd, ev, rs)
+);
+CREATE INDEX IF NOT EXISTS scenarios_state ON scenarios (state);
+"""
+
+# Colunas incluídas depois da primeira versão (acrescentadas a catálogos antigos ao abrir)
+ADDED_COLUMNS = {
+    'placement_hash': 'TEXT',
+    'alias_gd': 'INTEGER',
+    'alias_ev': 'INTEGER',
+    'alias_rs': 'INTEGER',
+    'max_v_pu': 'REAL',
+    'min_v_pu': 'REAL',
+    'max_loading': 'REAL',
+}
+
+class ScenarioCatalog:
+    """
+    Acesso ao catálogo (um arquivo SQLite compartilhado por todos os processos do estudo).
+
+    Uso típico de uma etapa:
+        catalog = ScenarioCatalog(caminho)
+        for scenario in catalog.claim(GENERATED, SOLVING):
+            ... resolver ...
+            catalog.mark(scenario, SOLVED, solve_seconds=tempo)
+    """
+    def __init__(self, path, timeout=60):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        columns = {row['name'] for row in self.connection.execute("PRAGMA table_info(scenarios)")}
+        for column, column_type in ADDED_COLUMNS.items():
+            if column not in columns:
+                self.connection.execute(f"ALTER TABLE scenarios ADD COLUMN {column} {column_type}")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS scenarios_placement ON scenarios (placement_hash)")
+
+    def close(self):
+        self.connection.close()
+
+    def register(self, scenarios):
+        """Inclui os cenários (GD, EV, RS) ainda não catalogados como pendentes"""
+        now = datetime.now().isoformat(timespec='seconds')
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO scenarios (gd, ev, rs, state, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(gd, ev, rs, PENDING, now) for gd, ev, rs in scenarios])
+
+    def recover(self, states=None):
+        """
+        Devolve ao estado anterior os cenários que ficaram "em andamento" em uma execução
+        interrompida. Chamar apenas quando nenhum outro processo estiver trabalhando nessas etapas
+        """
+        now = datetime.now().isoformat(timespec='seconds')
+        recovered = 0
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            for in_progress, previous in IN_PROGRESS.items():
+                if states is None or in_progress in states:
+                    recovered += self.connection.execute(
+                        "UPDATE scenarios SET state = ?, updated_at = ? WHERE state = ?",
+                        (previous, now, in_progress)).rowcount
+        return recovered
+
+    def claim(self, from_states, to_state, scenarios=None, limit=None, retry_stage=None):
+        """
+        Pega de forma atômica os cenários em from_states (opcionalmente só os da lista
+        scenarios), passando-os para to_state. Com retry_stage, também pega os cenários que
+        falharam nessa etapa. Retorna a lista de (GD, EV, RS) pegos
+        """
+        if isinstance(from_states, str):
+            from_states = [from_states]
+        placeholders = ", ".join("?" for _ in from_states)
+        now = datetime.now().isoformat(timespec='seconds')
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            rows = self.connection.execute(
+                f"SELECT gd, ev, rs FROM scenarios WHERE state IN ({placeholders}) "
+                f"OR (state = ? AND failed_stage = ?) ORDER BY gd, ev, rs",
+                [*from_states, FAILED, retry_stage]).fetchall()
+            claimed = [tuple(row) for row in rows]
+            if scenarios is not None:
+                wanted = set(map(tuple, scenarios))
+                claimed = [scenario for scenario in claimed if scenario in wanted]
+            if limit is not None:
+                claimed = claimed[:limit]
+            self.connection.executemany(
+                "UPDATE scenarios SET state = ?, updated_at = ? WHERE gd = ? AND ev = ? AND rs = ?",
+                [(to_state, now, *scenario) for scenario in claimed])
+        return claimed
+
+    def mark(self, scenario, state, **fields):
+        """
+        Atualiza o estado de um cenário e, opcionalmente, colunas como dss_path, dss_hash ou
+        tempos. Um cenário marcado como FAILED deixa de ser canônico: os seus alias voltam a
+        pendentes para serem gerados de novo. Retorna a quantidade de alias devolvidos
+        """
+        fields['state'] = state
+        fields['updated_at'] = datetime.now().isoformat(timespec='seconds')
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        released = 0
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.execute(
+                f"UPDATE scenarios SET {assignments} WHERE gd = ? AND ev = ? AND rs = ?",
+                [*fields.values(), *scenario])
+            if state == FAILED:
+                released = self.connection.execute(
+                    "UPDATE scenarios SET state = ?, alias_gd = NULL, alias_ev = NULL, alias_rs = NULL, "
+                    "updated_at = ? WHERE state = ? AND alias_gd = ? AND alias_ev = ? AND alias_rs = ?",
+                    [PENDING, fields['updated_at'], ALIASED, *scenario]).rowcount
+        return released
+
+    def canonical_for(self, placement_hash, scenario=None):
+        """
+        Cenário (GD, EV, RS) que já representa o circuito com esse hash de posicionamento,
+        ou None. Cenários com falha, pendentes (de uma execução interrompida, sem garantia
+        de serem gerados) ou que são alias de outro não são considerados
+        """
+        row = self.connection.execute(
+            "SELECT gd, ev, rs FROM scenarios WHERE placement_hash = ? AND state NOT IN (?, ?, ?) "
+            "AND NOT (gd = ? AND ev = ? AND rs = ?) ORDER BY gd, ev, rs LIMIT 1",
+            [placement_hash, ALIASED, FAILED, PENDING, *(scenario or (None, None, None))]).fetchone()
+        return tuple(row) if row else None
+
+    def alias(self, scenario, canonical, placement_hash):
+        """Marca o cenário como alias do cenário canônico (mesmo circuito, resolvido uma única vez)"""
+        gd, ev, rs = canonical
+        self.mark(scenario, ALIASED, placement_hash=placement_hash, alias_gd=gd, alias_ev=ev, alias_rs=rs)
+
+    def resolve(self, scenario):
+        """Cenário cujos resultados valem para este (o canônico, se for alias; senão o próprio)"""
+        row = self.get(scenario)
+        if row is not None and row['state'] == ALIASED:
+            return (row['alias_gd'], row['alias_ev'], row['alias_rs'])
+        return tuple(scenario)
+
+    def metrics(self, scenarios):
+        """
+        Métricas dos cenários resolvidos ({cenário: linha}), seguindo os alias até o
+        cenário canônico. Cenários ainda não resolvidos ficam de fora
+        """
+        results = {}
+        for scenario in scenarios:
+            row = self.get(self.resolve(scenario))
+            if row is not None and row['state'] in (SOLVED, AGGREGATING, AGGREGATED):
+                results[tuple(scenario)] = row
+        return results
+
+    def get(self, scenario):
+        """Linha do catálogo de um cenário (sqlite3.Row) ou None"""
+        return self.connection.execute(
+            "SELECT * FROM scenarios WHERE gd = ? AND ev = ? AND rs = ?", tuple(scenario)).fetchone()
+
+    def scenarios(self, states=None):
+        """Linhas do catálogo, opcionalmente apenas dos estados informados"""
+        if states is None:
+            return self.connection.execute("SELECT * FROM scenarios ORDER BY gd, ev, rs").fetchall()
+        if isinstance(states, str):
+            states = [states]
+        placeholders = ", ".join("?" for _ in states)
+        return self.connection.execute(
+            f"SELECT * FROM scenarios WHERE state IN ({placeholders}) ORDER BY gd, ev, rs", list(states)).fetchall()
+
+    def counts(self):
+        """Quantidade de cenários em cada estado ({estado: quantidade})"""
+        return dict(self.connection.execute("SELECT state, COUNT(*) FROM scenarios GROUP BY state").fetchall())
+
+# Função para calcular o hash (sha1) do conteúdo de um arquivo
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,114 @@
+# Armazenamento compacto dos cenários de um estudo.
+# Em vez de um arquivo DSS completo por cenário, guarda apenas quais UCs receberam
+# carregador de EV (e a curva de cada um) e quais receberam geração fotovoltaica.
+# O texto DSS é gerado sob demanda a partir da rede (ver DSSWriter.ScenarioGenerator).
+import os
+import numpy as np
+
+STORE_VERSION = 1
+
+class ScenarioStore:
+    """
+    Cenários (GD, EV, RS) em um único arquivo .npz:
+    - scenarios: uma linha (GD, EV, RS) por cenário
+    - ev / pv: bitsets (np.packbits) com uma linha por cenário e um bit por UC
+    - ev_curve: índice da curva de cada carregador (int8), na ordem das UCs, com
+      ev_offsets indicando onde começa cada cenário
+    - loads: nome de cada UC (PAC_índice), para conferir a rede ao materializar
+
+    Uso:
+        store = ScenarioStore(caminho, generator.load_keys())
+        store.add(gd, ev, rs, generator.select(config))
+        store.save()
+        generator.generate(config, selection=store.selection(gd, ev, rs))
+    """
+    def __init__(self, path, load_keys=None):
+        self.path = path
+        self.load_keys = None if load_keys is None else np.asarray(load_keys, dtype=str)
+        self.rows = {}  # (gd, ev, rs) -> posição nas listas abaixo
+        self.ev_bits = []
+        self.pv_bits = []
+        self.ev_curves = []
+
+        if os.path.exists(path):
+            self.load()
+
+    def load(self):
+        """Lê o arquivo do armazenamento, conferindo a versão e as UCs"""
+        with np.load(self.path) as stored:
+            if int(stored['version']) != STORE_VERSION:
+                raise ValueError(f"Versão do armazenamento de cenários não suportada: {self.path}")
+            if self.load_keys is not None and not np.array_equal(stored['loads'], self.load_keys):
+                raise ValueError(f"As UCs do armazenamento {self.path} não correspondem à rede atual")
+            self.load_keys = stored['loads']
+            # Cada acesso a stored[...] descomprime o array inteiro: ler uma única vez
+            ev_bits = stored['ev']
+            pv_bits = stored['pv']
+            ev_curves = stored['ev_curve']
+            offsets = stored['ev_offsets']
+            for row, scenario in enumerate(stored['scenarios'].tolist()):
+                self.rows[tuple(scenario)] = row
+                self.ev_bits.append(ev_bits[row])
+                self.pv_bits.append(pv_bits[row])
+                self.ev_curves.append(ev_curves[offsets[row]:offsets[row + 1]])
+
+    def __contains__(self, scenario):
+        return tuple(scenario) in self.rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def scenarios(self):
+        """Lista dos cenários (GD, EV, RS) armazenados, na ordem de inclusão"""
+        return list(self.rows)
+
+    def add(self, gd_percentage, ev_percentage, random_seed, selection):
+        """Inclui (ou substitui) um cenário a partir das posições das UCs com EV, curvas e GD"""
+        if self.load_keys is None:
+            raise ValueError("Informe as UCs da rede (load_keys) antes de incluir cenários")
+        ev_positions, ev_curves, pv_positions = selection
+        num_loads = len(self.load_keys)
+
+        # Guardar as curvas na ordem das UCs, como no bitset
+        order = np.argsort(ev_positions, kind='stable')
+        ev_mask = np.zeros(num_loads, dtype=bool)
+        ev_mask[ev_positions] = True
+        pv_mask = np.zeros(num_loads, dtype=bool)
+        pv_mask[pv_positions] = True
+
+        scenario = (gd_percentage, ev_percentage, random_seed)
+        row = self.rows.setdefault(scenario, len(self.rows))
+        values = (np.packbits(ev_mask), np.packbits(pv_mask), np.asarray(ev_curves, dtype=np.int8)[order])
+        for items, value in zip((self.ev_bits, self.pv_bits, self.ev_curves), values):
+            if row < len(items):
+                items[row] = value
+            else:
+                items.append(value)
+
+    def selection(self, gd_percentage, ev_percentage, random_seed):
+        """Posições das UCs com EV, curvas dos carregadores e posições das UCs com GD"""
+        row = self.rows[(gd_percentage, ev_percentage, random_seed)]
+        num_loads = len(self.load_keys)
+        ev_positions = np.flatnonzero(np.unpackbits(self.ev_bits[row], count=num_loads))
+        pv_positions = np.flatnonzero(np.unpackbits(self.pv_bits[row], count=num_loads))
+        return ev_positions, self.ev_curves[row], pv_positions
+
+    def save(self):
+        """Grava o armazenamento (arquivo temporário e renomeação)"""
+        num_loads = len(self.load_keys)
+        num_bytes = (num_loads + 7) // 8
+        ev_curves = self.ev_curves or [np.empty(0, dtype=np.int8)]
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                version=np.array(STORE_VERSION),
+                loads=self.load_keys,
+                scenarios=np.array(self.scenarios(), dtype=np.int32).reshape(-1, 3),
+                ev=np.array(self.ev_bits, dtype=np.uint8).reshape(-1, num_bytes),
+                pv=np.array(self.pv_bits, dtype=np.uint8).reshape(-1, num_bytes),
+                ev_curve=np.concatenate(ev_curves),
+                ev_offsets=np.concatenate([[0], np.cumsum([len(curves) for curves in self.ev_curves])]).astype(np.int64),
+            )
+        os.replace(temp_path, self.path)